@@ -1,4 +1,5 @@
 from pydantic import BaseModel, Field
+from typing import Literal
 
 
 class DataSourceConfig(BaseModel):
@@ -7,10 +8,15 @@ class DataSourceConfig(BaseModel):
 
 class FSDataSourceConfig(DataSourceConfig):
     fs_root: str
+    storage_format: Literal["dill", "npy"] = Field(default="dill")
 
 
 class MongoDBDataSourceConfig(DataSourceConfig):
     ingress_origin: str = Field(default=str)
+    # Files larger than this (in bytes) are chunked with GridFS, as documents cannot exceed 16 MB
+    gridfs_threshold: int = Field(default=8 * 1024 * 1024, gt=0, le=15 * 1024 * 1024)
+    batch_writes: bool = Field(default=False)
+    write_batch_size: int = Field(default=64, gt=0)
 
 
 class SunbeamSourceConfig(DataSourceConfig):
@@ -22,12 +28,21 @@ class InfluxDBDataSourceConfig(DataSourceConfig):
     start: str
     stop: str
     url: str
+    max_concurrent_queries: int = Field(default=8, gt=0)
+    max_retries: int = Field(default=3, ge=0)
+    retry_backoff: float = Field(default=1.0, ge=0)
+    query_chunk_hours: float | None = Field(default=None, gt=0)
+    checkpoint_directory: str | None = Field(default=None)
+    realtime_lateness: float = Field(default=60.0, ge=0)
 
 
 class SunbeamConfig(BaseModel):
     events_description_file: str
     ingress_description_file: str
     stages_to_run: list[str]
+    parallel_events: bool = Field(default=False)
+    max_event_workers: int = Field(default=4, gt=0)
+    use_stage_cache: bool = Field(default=True)
 
 
 class DataSourceConfigFactory:
@@ -0,0 +1,126 @@
+from data_tools.schema import File, FileType, CanonicalPath
+from data_tools.collections import TimeSeries
+from datetime import datetime
+import numpy as np
+import json
+
+
+# The attributes of a TimeSeries which are captured explicitly by its header
+_TIME_SERIES_ATTRIBUTES = {"_start", "_stop", "_units", "_length", "_period", "_meta"}
+
+
+def _to_json_compatible(value):
+    if isinstance(value, np.generic):
+        return value.item()
+
+    raise TypeError(f"{type(value)} is not JSON serializable!")
+
+
+def encode_header(file: File) -> str | None:
+    """
+    Describe everything about ``file`` except for the values of its data as JSON, such that ``file`` can be stored
+    as a raw numeric buffer alongside its header.
+
+    :param File file: the file to be described, which should contain a ``TimeSeries``
+    :return: the header as a JSON string, or ``None`` if ``file`` cannot be stored as a raw numeric buffer
+    """
+    time_series = file.data
+
+    if file.file_type != FileType.TimeSeries or not isinstance(time_series, TimeSeries):
+        return None
+
+    if time_series.dtype.hasobject or not isinstance(time_series.start, datetime):
+        return None
+
+    header = {
+        "file_type": str(file.file_type),
+        "metadata": file.metadata,
+        "description": file.description,
+        "dtype": time_series.dtype.str,
+        "shape": time_series.shape,
+        "start": time_series.start.isoformat(),
+        "stop": time_series.stop.isoformat(),
+        "units": time_series.units,
+        "period": time_series.period,
+        "length": time_series.length,
+        "meta": time_series.meta,
+        # Anything else that a stage has attached to the TimeSeries, such as a name
+        "attributes": {key: value for key, value in vars(time_series).items() if key not in _TIME_SERIES_ATTRIBUTES}
+    }
+
+    try:
+        return json.dumps(header, default=_to_json_compatible)
+
+    except (TypeError, ValueError):
+        return None
+
+
+def map_buffer(path: str, header: str) -> np.ndarray:
+    """
+    Memory-map the raw numeric buffer at ``path``, described by ``header``, copy-on-write.
+
+    :param str path: the path to a file containing only the raw numeric buffer
+    :param str header: the header produced by ``encode_header`` for the buffer
+    :return: the memory-mapped buffer
+    """
+    header = json.loads(header)
+    dtype, shape = np.dtype(header["dtype"]), tuple(header["shape"])
+
+    # Empty files cannot be memory-mapped, but there is also nothing to load
+    if np.prod(shape) == 0:
+        return np.empty(shape, dtype=dtype)
+
+    return np.memmap(path, dtype=dtype, mode="c", shape=shape)
+
+
+def read_buffer(data: bytes, header: str) -> np.ndarray:
+    """
+    View the raw numeric buffer ``data``, described by ``header``, as an array without copying it.
+
+    :param bytes data: the raw numeric buffer
+    :param str header: the header produced by ``encode_header`` for the buffer
+    :return: a read-only view of the buffer
+    """
+    header = json.loads(header)
+
+    return np.frombuffer(data, dtype=np.dtype(header["dtype"])).reshape(header["shape"])
+
+
+def decode_file(array: np.ndarray, header: str, canonical_path: CanonicalPath) -> File:
+    """
+    Reconstruct a ``File`` containing a ``TimeSeries`` from its raw numeric buffer and the header produced
+    by ``encode_header``. The ``TimeSeries`` will be a view of ``array``, such that no data is copied.
+
+    :param np.ndarray array: the raw numeric buffer of the ``TimeSeries``
+    :param str header: the header describing the ``File``
+    :param CanonicalPath canonical_path: the canonical path of the ``File``
+    :raises ValueError: if ``array`` is not the buffer described by ``header``
+    :return: the reconstructed ``File``
+    """
+    header = json.loads(header)
+
+    if array.dtype != np.dtype(header["dtype"]) or array.shape != tuple(header["shape"]):
+        raise ValueError(f"The buffer of {canonical_path.to_path()} ({array.dtype}, {array.shape}) does not match "
+                         f"its header ({header['dtype']}, {tuple(header['shape'])})!")
+
+    meta = dict(header["meta"])
+    meta.update({
+        "start": datetime.fromisoformat(header["start"]),
+        "stop": datetime.fromisoformat(header["stop"]),
+        "units": header["units"],
+        "period": header["period"],
+        "length": header["length"],
+    })
+
+    time_series = TimeSeries(array, meta)
+
+    for key, value in header["attributes"].items():
+        setattr(time_series, key, value)
+
+    return File(
+        canonical_path=canonical_path,
+        file_type=FileType(header["file_type"]),
+        metadata=header["metadata"],
+        description=header["description"],
+        data=time_series
+    )
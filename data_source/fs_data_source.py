@@ -2,7 +2,9 @@ import os
 
 from data_tools import File, FileType
 from data_tools.schema import DataSource, Result, FileLoader, CanonicalPath
+from data_source.columnar import encode_header, decode_file
 from pathlib import Path
+import numpy as np
 import dill
 from config import FSDataSourceConfig
 
@@ -11,24 +13,81 @@ class FSDataSource(DataSource):
     def __init__(self, data_source_config: FSDataSourceConfig):
         super().__init__()
         self._root = (Path(__file__).parent.parent / data_source_config.fs_root).absolute()
+        self._storage_format = data_source_config.storage_format
 
-    def canonical_path_to_real_path(self, canonical_path: CanonicalPath):
-        return str(self._root / canonical_path.to_path()) + ".bin"
+    def canonical_path_to_real_path(self, canonical_path: CanonicalPath, suffix: str = ".bin"):
+        return str(self._root / canonical_path.to_path()) + suffix
 
     def store(self, file: File) -> FileLoader:
         if file.data is not None:
             path = self.canonical_path_to_real_path(file.canonical_path)
             os.makedirs(Path(path).parent, exist_ok=True)
 
-            with open(self.canonical_path_to_real_path(file.canonical_path), "wb") as f:
-                dill.dump(file, f, protocol=dill.HIGHEST_PROTOCOL)
+            header = encode_header(file) if self._storage_format == "npy" else None
+
+            if header is not None:
+                # The header of any buffer being overwritten is removed first, and the new header is written last,
+                # such that a header is only ever present alongside the buffer it describes
+                self._remove(self.canonical_path_to_real_path(file.canonical_path, ".json"))
+
+                self._write(self.canonical_path_to_real_path(file.canonical_path, ".npy"),
+                            lambda f: np.save(f, np.ascontiguousarray(file.data), allow_pickle=False))
+
+                self._write(self.canonical_path_to_real_path(file.canonical_path, ".json"),
+                            lambda f: f.write(header.encode()))
+
+                self._remove(self.canonical_path_to_real_path(file.canonical_path, ".bin"))
+
+            else:
+                self._remove(self.canonical_path_to_real_path(file.canonical_path, ".json"))
+                self._remove(self.canonical_path_to_real_path(file.canonical_path, ".npy"))
+
+                self._write(path, lambda f: dill.dump(file, f, protocol=dill.HIGHEST_PROTOCOL))
 
         return FileLoader(lambda x: self.get(x), file.canonical_path)
 
+    def flush(self) -> None:
+        # Files are always written as soon as they are stored, so there is never anything to flush
+        pass
+
     def get(self, canonical_path: CanonicalPath, **kwargs) -> Result:
+        try:
+            with open(self.canonical_path_to_real_path(canonical_path, ".json"), "r") as f:
+                header = f.read()
+
+            # Map the buffer copy-on-write, so pages are only read when they are touched and any modifications
+            # made by a stage never make it back to disk
+            array = np.load(self.canonical_path_to_real_path(canonical_path, ".npy"), mmap_mode="c")
+
+            return Result.Ok(decode_file(array, header, canonical_path))
+
+        except FileNotFoundError:
+            pass
+
+        # The buffer was replaced between reading the header and mapping the buffer
+        except ValueError as e:
+            return Result.Err(e)
+
         try:
             with open(self.canonical_path_to_real_path(canonical_path), "rb") as f:
                 return Result.Ok(dill.load(f))
 
         except FileNotFoundError as e:
             return Result.Err(e)
+
+    @staticmethod
+    def _write(path: str, write) -> None:
+        # Write to a temporary file and then move it into place, such that an existing file at `path` which is
+        # currently memory-mapped is never truncated underneath its readers
+        with open(path + ".tmp", "wb") as f:
+            write(f)
+
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+
+        except FileNotFoundError:
+            pass
@@ -1,11 +1,20 @@
 from data_tools.schema import DataSource, FileLoader, Result, CanonicalPath
 from data_tools.query import DBClient
 from data_tools.utils import parse_iso_datetime
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from config import InfluxDBDataSourceConfig
+from pathlib import Path
+import pandas as pd
+import hashlib
+import logging
+import time
 import os
 
 
+logging.basicConfig(level=logging.INFO, handlers=[logging.StreamHandler()])
+logger = logging.getLogger()
+
+
 class InfluxDBDataSource(DataSource):
     def __init__(self, config: InfluxDBDataSourceConfig, *args, **kwargs):
         super().__init__()
@@ -13,10 +22,22 @@ class InfluxDBDataSource(DataSource):
         self._start = config.start
         self._stop = config.stop
         self._url = config.url
+        self._max_retries = config.max_retries
+        self._retry_backoff = config.retry_backoff
+
+        self._query_chunk_size = timedelta(hours=config.query_chunk_hours) if config.query_chunk_hours else None
+
+        if config.checkpoint_directory is not None:
+            self._checkpoint_directory = (Path(__file__).parent.parent / config.checkpoint_directory).absolute()
+            os.makedirs(self._checkpoint_directory, exist_ok=True)
+
+        else:
+            self._checkpoint_directory = None
 
         influxdb_token = os.getenv("INFLUX_TOKEN")
         influxdb_org = os.getenv("INFLUX_ORG")
 
+        # A single client is shared by every query, so that concurrent queries share its pool of connections
         self._influxdb_client = DBClient(influxdb_org, influxdb_token, url=self._url)
 
     def store(self, **kwargs) -> FileLoader:
@@ -36,17 +57,89 @@ class InfluxDBDataSource(DataSource):
         start_dt: datetime = parse_iso_datetime(start) + offset_dt
         stop_dt: datetime = parse_iso_datetime(stop) + offset_dt
 
+        query = {
+            "bucket": bucket,
+            "car": car,
+            "measurement": measurement,
+            "field": field,
+        }
+
         try:
-            return Result.Ok(
-                self._influxdb_client.query_series(
-                    start=start_dt,
-                    stop=stop_dt,
+            if self._query_chunk_size is None:
+                return Result.Ok(self._query(start_dt, stop_dt, **query))
+
+            chunks = [self._query_chunk(chunk_start, min(chunk_start + self._query_chunk_size, stop_dt), **query)
+                      for chunk_start in pd.date_range(start_dt, stop_dt, freq=self._query_chunk_size,
+                                                       inclusive="left").to_pydatetime()]
+
+            chunks = [chunk for chunk in chunks if len(chunk) > 0]
+            if not chunks:
+                raise ValueError("Query is empty! Verify that the data is visible on InfluxDB for the queried bucket.")
+
+            # Chunks are half-open, but drop any duplicates at the boundaries between them just in case
+            return Result.Ok(pd.concat(chunks, ignore_index=True).drop_duplicates(subset="_time", ignore_index=True))
+
+        except Exception as e:
+            return Result.Err(e)
+
+    def _query(self, start: datetime, stop: datetime, bucket: str, car: str, measurement: str,
+               field: str) -> pd.DataFrame:
+        """
+        Query InfluxDB, trying the query again with an exponential backoff if it fails.
+
+        :raises ValueError: if the query is empty, which trying again won't fix
+        """
+        for attempt in range(self._max_retries + 1):
+            try:
+                return self._influxdb_client.query_series(
+                    start=start,
+                    stop=stop,
                     bucket=bucket,
                     car=car,
                     measurement=measurement,
                     field=field,
                 )
-            )
 
-        except Exception as e:
-            return Result.Err(e)
+            except ValueError:
+                raise
+
+            except Exception as e:
+                if attempt == self._max_retries:
+                    raise
+
+                backoff = self._retry_backoff * 2 ** attempt
+                logger.warning(f"Query for {field} failed, retrying in {backoff:.1f}s: {e}")
+                time.sleep(backoff)
+
+    def _query_chunk(self, start: datetime, stop: datetime, **query) -> pd.DataFrame:
+        """
+        Query a single time window of a larger query, re-using the result of a previous run if it was checkpointed.
+
+        :return: the queried data, which will be empty if there was no data in this time window
+        """
+        checkpoint_path = self._checkpoint_path(start, stop, **query)
+
+        if checkpoint_path is not None and checkpoint_path.exists():
+            return pd.read_pickle(checkpoint_path)
+
+        try:
+            chunk = self._query(start, stop, **query)
+
+        except ValueError:  # This window is empty, but the others might not be
+            chunk = pd.DataFrame()
+
+        # Data may still arrive for a window that hasn't ended yet, so we can't checkpoint it
+        if checkpoint_path is not None and stop <= datetime.now(timezone.utc):
+            chunk.to_pickle(str(checkpoint_path) + ".tmp")
+            os.replace(str(checkpoint_path) + ".tmp", checkpoint_path)
+
+        return chunk
+
+    def _checkpoint_path(self, start: datetime, stop: datetime, bucket: str, car: str, measurement: str,
+                         field: str) -> Path | None:
+        if self._checkpoint_directory is None:
+            return None
+
+        key = f"{self._url}/{bucket}/{car}/{measurement}/{field}/{start.isoformat()}/{stop.isoformat()}"
+
+        return self._checkpoint_directory / f"{hashlib.sha256(key.encode()).hexdigest()}.pkl"
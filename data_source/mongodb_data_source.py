@@ -1,15 +1,32 @@
 from data_tools.schema import DataSource, FileLoader, File, Result, CanonicalPath, FileType
+from data_source.columnar import encode_header, decode_file, map_buffer
+from config import MongoDBDataSourceConfig
+import numpy as np
+import tempfile
 import pymongo
 import logging
+import threading
+import shutil
+import gridfs
+import weakref
+import uuid
 import dill
+import os
 
 
 logging.basicConfig(level=logging.INFO, handlers=[logging.StreamHandler()])
 logger = logging.getLogger()
 
 
+# Size of the chunks that GridFS splits large files into, and in which they are streamed back when acquired
+GRIDFS_CHUNK_SIZE_BYTES = 4 * 1024 * 1024
+
+# When writes are being batched, they are flushed once the data that they hold exceeds this many bytes
+MAX_PENDING_WRITE_BYTES = 64 * 1024 * 1024
+
+
 class MongoDBDataSource(DataSource):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, data_source_config: MongoDBDataSourceConfig = None, *args, **kwargs):
         super().__init__()
 
         def init_db():
@@ -22,12 +39,33 @@ class MongoDBDataSource(DataSource):
                 "data": []
             })
 
+        if data_source_config is None:
+            data_source_config = MongoDBDataSourceConfig(data_source_type="MongoDBDataSource")
+
+        self._gridfs_threshold = data_source_config.gridfs_threshold
+
+        # When batching writes, the documents that are waiting to be written, indexed by canonical path
+        self._batch_writes = data_source_config.batch_writes
+        self._write_batch_size = data_source_config.write_batch_size
+        self._pending_writes: dict[str, dict] = {}
+        self._pending_write_bytes = 0
+        self._pending_lock = threading.Lock()
+
         self._client = pymongo.MongoClient("mongodb://mongodb:27017/")
 
+        # TimeSeries that are acquired are spilled here, so that they can be memory-mapped instead of held in memory
+        self._spill_directory = tempfile.TemporaryDirectory(prefix="sunbeam-")
+
         self._db = self._client.sunbeam_db
 
         self._metadata_collection = self._db.metadata
         self._time_series_collection = self._db.time_series_data
+
+        # Files too large to fit into a single document are chunked into the `time_series_data.files` and
+        # `time_series_data.chunks` collections
+        self._gridfs = gridfs.GridFSBucket(self._db, bucket_name="time_series_data",
+                                           chunk_size_bytes=GRIDFS_CHUNK_SIZE_BYTES)
+
         db_status = self._metadata_collection.find_one({"type": "status"})
 
         if db_status is None:
@@ -41,37 +79,82 @@ class MongoDBDataSource(DataSource):
 
     def store(self, file: File) -> FileLoader:
         match file.file_type:
-            case FileType.TimeSeries:
+            case FileType.TimeSeries | FileType.Any:
                 if file.data is not None:
-                    serialized_object = dill.dumps(file.data)
-
-                    self._time_series_collection.replace_one(
-                        filter={
-                            "origin": file.canonical_path.origin,
-                            "source": file.canonical_path.source,
-                            "event": file.canonical_path.event,
-                            "name": file.canonical_path.name
-                        },
-                        replacement={
-                            "origin": file.canonical_path.origin,
-                            "source": file.canonical_path.source,
-                            "event": file.canonical_path.event,
-                            "name": file.canonical_path.name,
-                            "data": serialized_object,
-                            "metadata": file.metadata if file.metadata is not None else {},
-                            "description": file.description if file.description is not None else "",
-                            "filetype": str(file.file_type)
-                        },
-                        upsert=True  # Insert if it doesn't exist, otherwise replace
-                    )
+                    # TimeSeries are stored as a raw buffer with a header when possible, so that they can be
+                    # memory-mapped when acquired. Anything else is serialized.
+                    header = encode_header(file)
+                    if header is not None:
+                        serialized_object = np.ascontiguousarray(file.data).tobytes()
+
+                    else:
+                        serialized_object = dill.dumps(file.data)
+
+                    path_filter = {
+                        "origin": file.canonical_path.origin,
+                        "source": file.canonical_path.source,
+                        "event": file.canonical_path.event,
+                        "name": file.canonical_path.name
+                    }
+
+                    if len(serialized_object) > self._gridfs_threshold:
+                        gridfs_id = self._gridfs.upload_from_stream(
+                            file.canonical_path.to_string(),
+                            serialized_object,
+                            metadata=path_filter
+                        )
+                        serialized_object = None
+
+                    else:
+                        gridfs_id = None
+
+                    replacement = {
+                        "origin": file.canonical_path.origin,
+                        "source": file.canonical_path.source,
+                        "event": file.canonical_path.event,
+                        "name": file.canonical_path.name,
+                        "data": serialized_object,
+                        "gridfs_id": gridfs_id,
+                        "header": header,
+                        "metadata": file.metadata if file.metadata is not None else {},
+                        "description": file.description if file.description is not None else "",
+                        "filetype": str(file.file_type)
+                    }
+
+                    if self._batch_writes:
+                        self._defer_write(file.canonical_path, replacement)
+
+                    else:
+                        previous = self._time_series_collection.find_one_and_replace(
+                            filter=path_filter,
+                            replacement=replacement,
+                            projection={"gridfs_id": 1},
+                            upsert=True  # Insert if it doesn't exist, otherwise replace
+                        )
+
+                        # Don't leave behind the chunks of the file that was just replaced
+                        if previous is not None and previous.get("gridfs_id") is not None:
+                            self._gridfs.delete(previous["gridfs_id"])
 
                 return FileLoader(lambda x: self.get(x), file.canonical_path)
 
             case _:
                 raise RuntimeError(f"MongoDBDataSource does not support the storing of {file.file_type}!")
 
+    def flush(self) -> None:
+        """
+        Write any files that are waiting to be written because writes are being batched.
+        """
+        with self._pending_lock:
+            self._flush_pending_writes()
+
     def get(self, canonical_path: CanonicalPath, **kwargs) -> Result:
         try:
+            # Make sure that we don't miss a file that has been stored but not yet written
+            with self._pending_lock:
+                if canonical_path.to_string() in self._pending_writes:
+                    self._flush_pending_writes()
+
             result = self._time_series_collection.find_one({
                 "origin": canonical_path.origin,
                 "source": canonical_path.source,
@@ -82,7 +165,23 @@ class MongoDBDataSource(DataSource):
             if not result:
                 raise RuntimeError(f"Could not find file at {canonical_path.to_string()}!")
 
-            serialized_data = result.get("data")  # The data is stored as serialized bytes!
+            if result.get("header") is not None:
+                path = self._spill(result)
+                array = map_buffer(path, result["header"])
+                _remove_spill(path, array)
+
+                return Result.Ok(decode_file(array, result["header"], canonical_path))
+
+            if result.get("gridfs_id") is not None:
+                path = self._spill(result)
+
+                with open(path, "rb") as f:
+                    data = dill.load(f)
+
+                os.remove(path)
+
+            else:
+                data = dill.loads(result.get("data"))  # The data is stored as serialized bytes!
 
             return Result.Ok(
                 File(
@@ -90,9 +189,100 @@ class MongoDBDataSource(DataSource):
                     file_type=result.get("filetype"),
                     metadata=result.get("metadata"),
                     description=result.get("description"),
-                    data=dill.loads(serialized_data),
+                    data=data,
                 )
             )
 
         except Exception as e:
             return Result.Err(e)
+
+    def _defer_write(self, canonical_path: CanonicalPath, replacement: dict) -> None:
+        """
+        Hold ``replacement`` back to be written with the next batch, flushing the batch if it has become too large.
+        """
+        with self._pending_lock:
+            superseded = self._pending_writes.pop(canonical_path.to_string(), None)
+
+            if superseded is not None:
+                self._pending_write_bytes -= len(superseded["data"] or b"")
+
+                if superseded["gridfs_id"] is not None:
+                    self._gridfs.delete(superseded["gridfs_id"])
+
+            self._pending_writes[canonical_path.to_string()] = replacement
+            self._pending_write_bytes += len(replacement["data"] or b"")
+
+            if (len(self._pending_writes) >= self._write_batch_size or
+                    self._pending_write_bytes >= MAX_PENDING_WRITE_BYTES):
+                self._flush_pending_writes()
+
+    def _flush_pending_writes(self) -> None:
+        """
+        Write all pending documents in a single unordered bulk write. Expects ``self._pending_lock`` to be held.
+        """
+        if not self._pending_writes:
+            return
+
+        path_filters = [{
+            "origin": replacement["origin"],
+            "source": replacement["source"],
+            "event": replacement["event"],
+            "name": replacement["name"],
+        } for replacement in self._pending_writes.values()]
+
+        # Find the chunks of the files that are about to be replaced, so they aren't left behind
+        replaced_gridfs_ids = [previous["gridfs_id"] for previous in self._time_series_collection.find(
+            {"$or": path_filters, "gridfs_id": {"$ne": None}},
+            {"gridfs_id": 1}
+        )]
+
+        self._time_series_collection.bulk_write([
+            pymongo.ReplaceOne(path_filter, replacement, upsert=True)
+            for path_filter, replacement in zip(path_filters, self._pending_writes.values())
+        ], ordered=False)
+
+        for gridfs_id in replaced_gridfs_ids:
+            self._gridfs.delete(gridfs_id)
+
+        self._pending_writes.clear()
+        self._pending_write_bytes = 0
+
+    def _spill(self, result: dict) -> str:
+        """
+        Write the data of the document ``result`` to a new file in the spill directory, streaming it chunk by
+        chunk if it was stored with GridFS.
+
+        :return: the path to the new file
+        """
+        path = os.path.join(self._spill_directory.name, uuid.uuid4().hex)
+
+        with open(path, "wb") as f:
+            if result.get("gridfs_id") is not None:
+                with self._gridfs.open_download_stream(result["gridfs_id"]) as stream:
+                    shutil.copyfileobj(stream, f, GRIDFS_CHUNK_SIZE_BYTES)
+
+            else:
+                f.write(result["data"])
+
+        return path
+
+
+def _remove_spill(path: str, array: np.ndarray) -> None:
+    """
+    Remove the spill file at ``path`` once ``array`` has been mapped from it, such that spill files don't accumulate
+    for as long as the data source lives. A mapping stays valid after its file is removed on POSIX, but not on
+    Windows, where the file is instead removed once ``array`` (and every view of it) has been garbage-collected.
+    """
+    try:
+        os.remove(path)
+
+    except OSError:
+        weakref.finalize(array, _remove_quietly, path)
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+
+    except OSError:
+        pass
@@ -7,7 +7,9 @@ from bokeh.plotting import figure, output_file, save
 from bokeh.models import ColumnDataSource, DatetimeTickFormatter
 from data_tools.collections import TimeSeries
 from data_tools.schema import File, CanonicalPath
+from data_source.columnar import decode_file, read_buffer
 import numpy as np
+import gridfs
 import dill
 
 
@@ -75,7 +77,27 @@ def _query_file(collection, pipeline: str, event: str, stage: str, name: str):
     })
 
 
-def _serve_file(file, origin, event, source, name, file_type):
+def _load_data(collection, file) -> TimeSeries | np.ndarray:
+    """
+    Reconstruct the data of ``file``, which is either serialized, or a raw buffer described by a header for a
+    ``TimeSeries`` (see ``data_source.columnar``). Large files are stored with GridFS, rather than in ``file``.
+    """
+    if file.get("gridfs_id") is not None:
+        data = gridfs.GridFSBucket(collection.database, bucket_name=collection.name).open_download_stream(
+            file["gridfs_id"]).read()
+
+    else:
+        data = file["data"]
+
+    if file.get("header") is None:
+        return dill.loads(data)
+
+    canonical_path = CanonicalPath(origin=file["origin"], event=file["event"], source=file["source"], name=file["name"])
+
+    return decode_file(read_buffer(data, file["header"]), file["header"], canonical_path).data
+
+
+def _serve_file(collection, file, origin, event, source, name, file_type):
     match file_type:
         case "bin":
             file = File(
@@ -85,7 +107,7 @@ def _serve_file(file, origin, event, source, name, file_type):
                     source=source,
                     name=name,
                 ),
-                data=dill.loads(file["data"]),
+                data=_load_data(collection, file),
                 metadata=file["metadata"],
                 file_type=file["filetype"],
                 description=file["description"]
@@ -97,7 +119,7 @@ def _serve_file(file, origin, event, source, name, file_type):
             return send_file(file_stream, as_attachment=True, download_name=f"{name}.{file_type}")
 
         case "plot":
-            data: TimeSeries | np.ndarray = dill.loads(file["data"])
+            data: TimeSeries | np.ndarray = _load_data(collection, file)
 
             return _create_bokeh_plot(data, name)
 
@@ -158,6 +180,7 @@ def get_file(collection, path, request_args):
             # User is trying to download file data in a certain form
             else:
                 return _serve_file(
+                    collection,
                     file,
                     path_parts[0],
                     path_parts[1],
@@ -6,6 +6,7 @@ import logging
 from prefect import exceptions as prefect_exceptions
 from prefect.client.orchestration import get_client
 import docker
+import gridfs
 import datetime
 import sys
 import asyncio
@@ -53,6 +54,11 @@ def decommission_pipeline(collection, git_target):
 
     collection.delete_many({"origin": git_target})
 
+    # Large files are chunked with GridFS, and must be deleted separately
+    bucket = gridfs.GridFSBucket(collection.database, bucket_name=collection.name)
+    for grid_file in bucket.find({"metadata.origin": git_target}):
+        bucket.delete(grid_file._id)
+
     async def delete_deployment_by_name(deployment_name):
         async with get_client() as prefect_client:
             try:
@@ -10,6 +10,10 @@ from .configure import (
     build_stage_graph
 )
 
+from .schedule import (
+    schedule_event
+)
+
 from .run import (
     run_sunbeam
 )
@@ -21,5 +25,6 @@ __all__ = [
     "build_stage_graph",
     "build_config",
     "run_sunbeam",
+    "schedule_event",
     "DataFrameTarget"
 ]
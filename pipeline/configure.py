@@ -25,15 +25,23 @@ def build_config() -> tuple[SunbeamConfig, DataSourceConfig, DataSourceConfig, L
     return sunbeam_config, data_source_config, ingress_config, targets, events
 
 
-def _add_dependencies(dependency_graph: nx.Graph, stage_id: str):
+def _add_dependencies(dependency_graph: nx.DiGraph, stage_id: str):
     dependency_graph.add_node(stage_id)
 
     stage_cls = stage_registry.get_stage(stage_id)
     for dep_id in stage_cls.dependencies():
+        dependency_graph.add_edge(stage_id, dep_id)
         _add_dependencies(dependency_graph, dep_id)
 
 
 def build_stage_graph(stages_to_run: List[str]) -> List[str]:
+    """
+    Determine the stages that must be run in order to run each of ``stages_to_run``, which are
+    ``stages_to_run`` and all of their ancestors.
+
+    :param List[str] stages_to_run: the names of the stages that are desired
+    :return: the names of every required stage, ordered such that each stage comes after its dependencies
+    """
     # Build a dependency graph
     dependency_graph = nx.DiGraph()
 
@@ -1,11 +1,14 @@
-from data_tools import DataSource
-from prefect import flow
+from data_tools import DataSource, Event
+from prefect import flow, task
+from prefect.task_runners import ThreadPoolTaskRunner
 from logs import SunbeamLogger
 from data_source import DataSourceFactory
-from pipeline.configure import build_config
+from config import SunbeamConfig
+from pipeline.configure import build_config, build_stage_graph
+from pipeline.schedule import schedule_event
 from dotenv import load_dotenv
-from stage import (Context, IngressStage, EnergyStage, PowerStage,
-                   WeatherStage, EfficiencyStage, LocalizationStage, CleanupStage, ArrayStage)
+from typing import List
+from stage import Context, IngressStage
 
 logger = SunbeamLogger("sunbeam")
 
@@ -13,6 +16,67 @@ logger = SunbeamLogger("sunbeam")
 load_dotenv()
 
 
+@task(name="Process Event")
+def process_event(event: Event, ingress_outputs: dict, required_stages: List[str]) -> None:
+    """
+    Run every required stage downstream of ingress for a single event.
+
+    Each event is processed independently of every other event, so this may be run concurrently across events.
+
+    :param Event event: the event to be processed
+    :param dict ingress_outputs: the outputs of the ingress stage, indexed first by event name, then by target name
+    :param List[str] required_stages: the names of the stages to be run
+    """
+    schedule_event(event, ingress_outputs, required_stages)
+
+
+def process_events(
+        sunbeam_config: SunbeamConfig,
+        events: List[Event],
+        ingress_outputs: dict,
+        required_stages: List[str]
+) -> None:
+    """
+    Process each event in ``events``, either one after another or, if ``parallel_events`` is enabled,
+    concurrently across a bounded pool of ``max_event_workers`` workers.
+
+    A failure while processing one event does not prevent the remaining events from being processed.
+
+    :raises RuntimeError: if any event failed to be processed, after all events have been attempted.
+    """
+    if sunbeam_config.parallel_events:
+        logger.info(f"Processing {len(events)} events with up to {sunbeam_config.max_event_workers} workers...")
+
+        with ThreadPoolTaskRunner(max_workers=sunbeam_config.max_event_workers) as task_runner:
+            futures = {
+                event.name: task_runner.submit(
+                    process_event,
+                    parameters={
+                        "event": event,
+                        "ingress_outputs": ingress_outputs,
+                        "required_stages": required_stages
+                    }
+                ) for event in events
+            }
+
+            for future in futures.values():
+                future.wait()
+
+            event_states = {event_name: future.state for event_name, future in futures.items()}
+
+    else:
+        event_states = {event.name: process_event(event, ingress_outputs, required_stages, return_state=True) for event in events}
+
+    failed_events = [event_name for event_name, state in event_states.items() if state.is_failed()]
+
+    for event_name in failed_events:
+        logger.error(f"Failed to process {event_name}: {event_states[event_name].message}")
+
+    if failed_events:
+        raise RuntimeError(f"Failed to process {len(failed_events)} of {len(events)} events: "
+                           f"{', '.join(failed_events)}")
+
+
 @flow(log_prints=True)
 def run_sunbeam(git_target="pipeline", ingress_to_skip=None, stages_to_skip=None):
     if stages_to_skip is None:
@@ -23,81 +87,20 @@ def run_sunbeam(git_target="pipeline", ingress_to_skip=None, stages_to_skip=None
 
     sunbeam_config, data_source_config, ingress_config, targets, events = build_config()
 
+    # Only run the stages that were asked for, and the stages that they depend on
+    required_stages: List[str] = build_stage_graph(sunbeam_config.stages_to_run)
+    logger.info(f"Running stages: {', '.join(required_stages)}")
+
     data_source: DataSource = DataSourceFactory.build(data_source_config.data_source_type, data_source_config)
-    context: Context = Context(git_target, data_source, stages_to_skip)  # Set the global context
+    # Set the global context
+    context: Context = Context(git_target, data_source, stages_to_skip, sunbeam_config.use_stage_cache)
 
     ingress_stage: IngressStage = IngressStage(ingress_config)
 
     ingress_outputs: dict = IngressStage.run(ingress_stage, targets, events, ingress_to_skip)
 
-    # We will process each event separately.
-    for event in events:
-
-        cleanup_stage: CleanupStage = CleanupStage(event)
-        speed_mps, = CleanupStage.run(
-            cleanup_stage,
-            ingress_outputs[event.name]["VehicleVelocity"],
-            ingress_outputs[event.name]["MotorRotatingSpeed"],
-        )
-
-        power_stage: PowerStage = PowerStage(event)
-        pack_power, motor_power = PowerStage.run(
-            power_stage,
-            ingress_outputs[event.name]["TotalPackVoltage"],
-            ingress_outputs[event.name]["PackCurrent"],
-            ingress_outputs[event.name]["BatteryVoltage"],
-            ingress_outputs[event.name]["BatteryCurrent"],
-            ingress_outputs[event.name]["BatteryCurrentDirection"],
-        )
-
-        array_stage: ArrayStage = ArrayStage(event)
-        array_power, = ArrayStage.run(
-            array_stage,
-            ingress_outputs[event.name]["ArrayVoltageStringA"],
-            ingress_outputs[event.name]["ArrayVoltageStringB"],
-            ingress_outputs[event.name]["ArrayVoltageStringC"],
-            ingress_outputs[event.name]["ArrayCurrentStringA"],
-            ingress_outputs[event.name]["ArrayCurrentStringB"],
-            ingress_outputs[event.name]["ArrayCurrentStringC"],
-        )
-
-        energy_stage: EnergyStage = EnergyStage(event)
-        (
-            integrated_pack_power,
-            energy_vol_extrapolated,
-            energy_from_integrated_power,
-            unfiltered_soc,
-            soc
-        ) = EnergyStage.run(
-            energy_stage,
-            ingress_outputs[event.name]["VoltageofLeast"],
-            pack_power,
-            ingress_outputs[event.name]["TotalPackVoltage"],
-            ingress_outputs[event.name]["PackCurrent"]
-        )
-
-        localization_stage: LocalizationStage = LocalizationStage(event)
-        (lap_index, track_index, lap_index_integrated_speed, lap_index_spreadsheet, track_distance_spreadsheet,
-         track_index_spreadsheet, gps_latitude, gps_longitude, track_index_gps) = LocalizationStage.run(
-            localization_stage,
-            ingress_outputs[event.name]["GPSLatitude"],
-            ingress_outputs[event.name]["GPSLongitude"],
-            speed_mps,
-        )
-
-        efficiency_stage: EfficiencyStage = EfficiencyStage(event)
-        efficiency_5min, efficiency_1h, efficiency_lap_distance = EfficiencyStage.run(
-            efficiency_stage,
-            speed_mps,
-            motor_power,
-            lap_index
-        )
-
-        weather_stage: WeatherStage = WeatherStage(event)
-        (air_temperature, azimuth, dhi, dni, ghi, precipitation_rate,
-         wind_direction_10m, wind_speed_10m, zenith) = WeatherStage.run(
-            weather_stage,
-        )
+    # We will process each event separately, since events are independent of one another.
+    process_events(sunbeam_config, events, ingress_outputs, required_stages)
 
 
 if __name__ == "__main__":
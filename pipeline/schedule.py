@@ -0,0 +1,140 @@
+from data_tools import Event
+from data_tools.schema import FileLoader
+from prefect.futures import PrefectFuture, as_completed
+from typing import Callable, Dict, List
+from logs import SunbeamLogger
+from stage import (stage_registry, IngressStage, EnergyStage, PowerStage, WeatherStage, EfficiencyStage,
+                   LocalizationStage, CleanupStage, ArrayStage)
+from stage.alignment import release_alignment_cache
+
+
+logger = SunbeamLogger("sunbeam")
+
+
+# Maps the event being processed, the outputs of ingress, and the outputs of the stages that have already been run
+# (indexed by stage name) to the arguments that a stage's `run` should be invoked with (after the stage itself).
+StageInputs = Callable[[Event, dict, Dict[str, tuple[FileLoader, ...]]], tuple[FileLoader, ...]]
+
+
+def _cleanup_inputs(event: Event, ingress_outputs: dict, stage_outputs: dict) -> tuple[FileLoader, ...]:
+    return (
+        ingress_outputs[event.name]["VehicleVelocity"],
+        ingress_outputs[event.name]["MotorRotatingSpeed"],
+    )
+
+
+def _power_inputs(event: Event, ingress_outputs: dict, stage_outputs: dict) -> tuple[FileLoader, ...]:
+    return (
+        ingress_outputs[event.name]["TotalPackVoltage"],
+        ingress_outputs[event.name]["PackCurrent"],
+        ingress_outputs[event.name]["BatteryVoltage"],
+        ingress_outputs[event.name]["BatteryCurrent"],
+        ingress_outputs[event.name]["BatteryCurrentDirection"],
+    )
+
+
+def _array_inputs(event: Event, ingress_outputs: dict, stage_outputs: dict) -> tuple[FileLoader, ...]:
+    return (
+        ingress_outputs[event.name]["ArrayVoltageStringA"],
+        ingress_outputs[event.name]["ArrayVoltageStringB"],
+        ingress_outputs[event.name]["ArrayVoltageStringC"],
+        ingress_outputs[event.name]["ArrayCurrentStringA"],
+        ingress_outputs[event.name]["ArrayCurrentStringB"],
+        ingress_outputs[event.name]["ArrayCurrentStringC"],
+    )
+
+
+def _energy_inputs(event: Event, ingress_outputs: dict, stage_outputs: dict) -> tuple[FileLoader, ...]:
+    pack_power, motor_power = stage_outputs[PowerStage.get_stage_name()]
+
+    return (
+        ingress_outputs[event.name]["VoltageofLeast"],
+        pack_power,
+        ingress_outputs[event.name]["TotalPackVoltage"],
+        ingress_outputs[event.name]["PackCurrent"],
+    )
+
+
+def _localization_inputs(event: Event, ingress_outputs: dict, stage_outputs: dict) -> tuple[FileLoader, ...]:
+    speed_mps, = stage_outputs[CleanupStage.get_stage_name()]
+
+    return (
+        ingress_outputs[event.name]["GPSLatitude"],
+        ingress_outputs[event.name]["GPSLongitude"],
+        speed_mps,
+    )
+
+
+def _efficiency_inputs(event: Event, ingress_outputs: dict, stage_outputs: dict) -> tuple[FileLoader, ...]:
+    speed_mps, = stage_outputs[CleanupStage.get_stage_name()]
+    pack_power, motor_power = stage_outputs[PowerStage.get_stage_name()]
+    lap_index, *_ = stage_outputs[LocalizationStage.get_stage_name()]
+
+    return speed_mps, motor_power, lap_index
+
+
+def _weather_inputs(event: Event, ingress_outputs: dict, stage_outputs: dict) -> tuple[FileLoader, ...]:
+    return ()
+
+
+stage_inputs: Dict[str, StageInputs] = {
+    CleanupStage.get_stage_name(): _cleanup_inputs,
+    PowerStage.get_stage_name(): _power_inputs,
+    ArrayStage.get_stage_name(): _array_inputs,
+    EnergyStage.get_stage_name(): _energy_inputs,
+    LocalizationStage.get_stage_name(): _localization_inputs,
+    EfficiencyStage.get_stage_name(): _efficiency_inputs,
+    WeatherStage.get_stage_name(): _weather_inputs,
+}
+
+
+def _is_ready(stage_id: str, stage_outputs: dict) -> bool:
+    dependencies = stage_registry.get_stage(stage_id).dependencies()
+
+    return all(dep_id in stage_outputs for dep_id in dependencies if dep_id != IngressStage.get_stage_name())
+
+
+def schedule_event(event: Event, ingress_outputs: dict, required_stages: List[str]) -> Dict[str, tuple[FileLoader, ...]]:
+    """
+    Run each stage in ``required_stages`` for ``event``, submitting each stage as soon as all the stages that it
+    depends on have finished, such that independent stages run concurrently.
+
+    Ingress is expected to have already been run, and its outputs are provided as ``ingress_outputs``.
+
+    The stages of ``event`` share a cache of TimeSeries alignments (see ``stage.alignment``), which is discarded once
+    every stage has finished.
+
+    :param Event event: the event to be processed
+    :param dict ingress_outputs: the outputs of the ingress stage, indexed first by event name, then by target name
+    :param List[str] required_stages: the names of the stages to be run, which must include all of their dependencies
+    :raises RuntimeError: if some of ``required_stages`` can never be run because their dependencies are not required
+    :return: the outputs of each stage that was run, indexed by stage name
+    """
+    pending: List[str] = [stage_id for stage_id in required_stages if stage_id != IngressStage.get_stage_name()]
+    running: Dict[PrefectFuture, str] = {}
+    stage_outputs: Dict[str, tuple[FileLoader, ...]] = {}
+
+    try:
+        while pending or running:
+            for stage_id in [stage_id for stage_id in pending if _is_ready(stage_id, stage_outputs)]:
+                stage_cls = stage_registry.get_stage(stage_id)
+                stage = stage_cls(event)
+
+                running[stage_cls.run.submit(stage, *stage_inputs[stage_id](event, ingress_outputs, stage_outputs))] = stage_id
+                pending.remove(stage_id)
+
+            if not running:
+                raise RuntimeError(f"Unable to schedule {', '.join(pending)} for {event.name} as their dependencies "
+                                   f"are not being run!")
+
+            finished: PrefectFuture = next(as_completed(list(running)))
+            stage_id = running.pop(finished)
+
+            stage_outputs[stage_id] = finished.result()
+            logger.info(f"Finished {stage_id} for {event.name}.")
+
+    finally:
+        # Alignments are shared between the stages of this event only, so they are no longer needed
+        release_alignment_cache(event.name)
+
+    return stage_outputs
@@ -0,0 +1,194 @@
+from data_tools.collections import TimeSeries
+from numpy.typing import NDArray
+from collections import OrderedDict
+import numpy as np
+import datetime
+import threading
+import math
+
+
+# Number of alignment maps that are kept for each event, which bounds the memory used by each event's cache
+DEFAULT_MAX_ALIGNMENT_MAPS = 32
+
+
+# (start, stop, length, period, number of samples, time zone) of a TimeSeries
+TimeGrid = tuple[float, float, float, float, int, datetime.tzinfo | None]
+
+
+def time_grid(time_series: TimeSeries) -> TimeGrid:
+    """
+    Get the times at which ``time_series`` is sampled, which is everything that aligning it depends on besides its
+    values.
+    """
+    return (
+        time_series.start.timestamp(),
+        time_series.stop.timestamp(),
+        time_series.length,
+        time_series.period,
+        len(time_series),
+        time_series.start.tzinfo
+    )
+
+
+def _index_of(x_axis: NDArray, time: float) -> int:
+    """
+    Find the index of the element of the increasing ``x_axis`` closest to ``time``, which is identical to
+    ``TimeSeries.index_of`` (including breaking ties by the lowest index) but takes O(log n) time.
+    """
+    index = int(np.searchsorted(x_axis, time))
+
+    if index == 0:
+        return 0
+
+    if index == len(x_axis):
+        return len(x_axis) - 1
+
+    return index - 1 if abs(x_axis[index - 1] - time) <= abs(x_axis[index] - time) else index
+
+
+def _fromtimestamp(timestamp: float, tz: datetime.tzinfo | None) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(timestamp, tz) if tz is not None else datetime.datetime.fromtimestamp(timestamp)
+
+
+class AlignmentMap:
+    """
+    How the samples of a TimeSeries are interpolated onto the common time grid of an alignment, as done by
+    ``TimeSeries.align``. It only depends on the time grids involved, not on any values, so the samples that fall
+    within the alignment and the timestamps that they are interpolated between are found once, and applied to every
+    TimeSeries sampled at the same times with a single ``np.interp``.
+    """
+    def __init__(self, source_grid: TimeGrid, start_time: float, end_time: float, period: float):
+        """
+        :param source_grid: the time grid of the TimeSeries being aligned, see ``time_grid``
+        :param float start_time: UNIX timestamp at which the alignment starts
+        :param float end_time: UNIX timestamp at which the alignment ends
+        :param float period: the period of the alignment, in seconds
+        :raises ValueError: if the alignment is not within the time grid of the TimeSeries being aligned
+        """
+        source_start, source_stop, source_length, _, num_samples, tz = source_grid
+
+        for timestamp in (start_time, end_time):
+            if not (source_start <= timestamp <= source_stop and 0.0 <= timestamp - source_start <= source_length):
+                raise ValueError(f"UNIX time {timestamp} falls outside of x–axis, which is "
+                                 f"{source_start}–{source_stop}!")
+
+        source_x_axis = np.linspace(0.0, source_length, num_samples)
+        self._start_index = _index_of(source_x_axis, start_time - source_start)
+        self._stop_index = _index_of(source_x_axis, end_time - source_start) + 1
+
+        self._start = _fromtimestamp(start_time, tz)
+        self._stop = _fromtimestamp(end_time, tz)
+        self._period = period
+        self._length = end_time - start_time
+
+        # The UNIX timestamps of the alignment, and of the samples being aligned, exactly as ``TimeSeries.align``
+        # builds them, where the samples are spread evenly from the start to the end of the alignment
+        self._x = np.linspace(start_time, end_time, math.ceil(self._length / period) + 1)
+        self._xp = np.linspace(0.0, self._length, self._stop_index - self._start_index) + self._start.timestamp()
+
+    def apply(self, time_series: TimeSeries) -> TimeSeries:
+        """
+        Align ``time_series``, which must be sampled on the time grid that this map was built for.
+
+        :param time_series: the TimeSeries to be aligned
+        :return: ``time_series`` interpolated onto the time grid of the alignment
+        """
+        values = np.asarray(time_series)[self._start_index:self._stop_index]
+        interpolated = np.interp(self._x, self._xp, values)
+
+        return TimeSeries(interpolated, {
+            "start": self._start,
+            "stop": self._stop,
+            "car": time_series.meta["car"],
+            "measurement": time_series.meta["measurement"],
+            "field": time_series.meta["field"],
+            "period": self._period,
+            "length": self._length,
+            "units": time_series.units,
+        })
+
+
+class AlignmentCache:
+    """
+    Align TimeSeries as ``TimeSeries.align`` does, caching the map used to align each TimeSeries by its time grid and
+    the time grid of the alignment. TimeSeries sampled at the same times, such as the same data used by several
+    stages, or different data from the same source, reuse the same maps.
+    """
+    def __init__(self, max_alignment_maps: int = DEFAULT_MAX_ALIGNMENT_MAPS):
+        """
+        :param int max_alignment_maps: the number of alignment maps to keep, discarding the least recently used
+        """
+        self._max_alignment_maps = max_alignment_maps
+        self._alignment_maps: OrderedDict[tuple, AlignmentMap] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def align(self, *args: TimeSeries) -> list[TimeSeries]:
+        """
+        Align ``args`` onto a common time grid, which is identical to ``TimeSeries.align(*args)``.
+
+        :raises ValueError: if ``args`` do not all overlap in time
+        :return: each of ``args``, aligned
+        """
+        start_time = max(arg.start.timestamp() for arg in args)
+        end_time = min(arg.stop.timestamp() for arg in args)
+        period = min(arg.period for arg in args)
+
+        return [self._get_alignment_map(time_grid(arg), start_time, end_time, period).apply(arg) for arg in args]
+
+    def _get_alignment_map(self, source_grid: TimeGrid, start_time: float, end_time: float,
+                           period: float) -> AlignmentMap:
+        key = (source_grid, start_time, end_time, period)
+
+        with self._lock:
+            if key in self._alignment_maps:
+                self._alignment_maps.move_to_end(key)
+                return self._alignment_maps[key]
+
+        # Built outside the lock, since building the same map twice is harmless but holding the lock is not
+        alignment_map = AlignmentMap(source_grid, start_time, end_time, period)
+
+        with self._lock:
+            self._alignment_maps[key] = alignment_map
+            while len(self._alignment_maps) > self._max_alignment_maps:
+                self._alignment_maps.popitem(last=False)
+
+        return alignment_map
+
+    def clear(self) -> None:
+        with self._lock:
+            self._alignment_maps.clear()
+
+
+_alignment_caches: dict[str, AlignmentCache] = {}
+_alignment_caches_lock = threading.Lock()
+
+
+def get_alignment_cache(event_name: str) -> AlignmentCache:
+    """
+    Get the alignment cache for ``event_name``, which is shared by every stage processing that event.
+    """
+    with _alignment_caches_lock:
+        if event_name not in _alignment_caches:
+            _alignment_caches[event_name] = AlignmentCache()
+
+        return _alignment_caches[event_name]
+
+
+def release_alignment_cache(event_name: str) -> None:
+    """
+    Discard the alignment cache for ``event_name``, once the event has been processed.
+    """
+    with _alignment_caches_lock:
+        _alignment_caches.pop(event_name, None)
+
+
+def align(event_name: str, *args: TimeSeries) -> list[TimeSeries]:
+    """
+    Align ``args`` onto a common time grid, identically to ``TimeSeries.align(*args)``, reusing the maps of any
+    earlier alignments of TimeSeries sampled at the same times within ``event_name``.
+
+    :param str event_name: the event that ``args`` belong to
+    :param args: the TimeSeries to be aligned
+    :return: each of ``args``, aligned
+    """
+    return get_alignment_cache(event_name).align(*args)
@@ -1,6 +1,7 @@
 from data_tools.schema import FileLoader
 from stage.stage import Stage
 from stage.stage_registry import stage_registry
+from stage.alignment import align
 from data_tools.schema import Result, UnwrappedError, File, FileType, CanonicalPath, Event
 from data_tools.collections import TimeSeries
 from prefect import task
@@ -91,16 +92,16 @@ class ArrayStage(Stage):
             output_current_b = output_current_b_result.unwrap().data
             output_current_c = output_current_c_result.unwrap().data
 
-            output_voltage_a, output_current_a = TimeSeries.align(output_voltage_a, output_current_a)
+            output_voltage_a, output_current_a = align(self.event_name, output_voltage_a, output_current_a)
             array_power_a = output_voltage_a * output_current_a
 
-            output_voltage_b, output_current_b = TimeSeries.align(output_voltage_b, output_current_b)
+            output_voltage_b, output_current_b = align(self.event_name, output_voltage_b, output_current_b)
             array_power_b = output_voltage_b * output_current_b
 
-            output_voltage_c, output_current_c = TimeSeries.align(output_voltage_c, output_current_c)
+            output_voltage_c, output_current_c = align(self.event_name, output_voltage_c, output_current_c)
             array_power_c = output_voltage_c * output_current_c
 
-            array_power_a, array_power_b, array_power_c = TimeSeries.align(array_power_a, array_power_b, array_power_c)
+            array_power_a, array_power_b, array_power_c = align(self.event_name, array_power_a, array_power_b, array_power_c)
 
             array_power = array_power_a + array_power_b + array_power_c
 
@@ -15,17 +15,19 @@ class SingletonMeta(type):
 class Context(metaclass=SingletonMeta):
     """Singleton class that holds global context information for Sunbeam."""
 
-    def __init__(self, title: str, data_source: DataSource, stages_to_skip: List[str]):
+    def __init__(self, title: str, data_source: DataSource, stages_to_skip: List[str], use_stage_cache: bool = True):
         """
         Initialize the global ``Context``.
         :param title: the title of the current Sunbeam pipeline that is running
         :param data_source: the ``DataSource`` for stages to acquire and store data
         :param stages_to_skip: the list of stages that should be skipped (any others will be ran)
+        :param use_stage_cache: whether stages may reuse their stored outputs when their inputs are unchanged
         """
         if not hasattr(self, "_initialized"):  # Ensures __init__ runs only once
             self._title = title
             self._data_source = data_source
             self._stages_to_skip = stages_to_skip
+            self._use_stage_cache = use_stage_cache
             self._initialized = True
 
         else:
@@ -52,6 +54,13 @@ class Context(metaclass=SingletonMeta):
         """
         return self._stages_to_skip
 
+    @property
+    def use_stage_cache(self) -> bool:
+        """
+        Whether stages may reuse their stored outputs when their inputs, static data, and code are unchanged
+        """
+        return self._use_stage_cache
+
     @classmethod
     def is_initialized(cls) -> bool:
         """
@@ -1,10 +1,12 @@
 from data_tools.schema import FileLoader
 from stage.stage import Stage
 from stage.stage_registry import stage_registry
+from stage.alignment import align
 from data_tools.schema import Result, UnwrappedError, File, FileType, CanonicalPath, Event
 from data_tools.collections import TimeSeries
 from prefect import task
 import numpy as np
+import math
 
 MIN_AVG_METERS_PER_SEC = 2
 MAX_AVG_METERS_PER_SEC = 50
@@ -14,23 +16,41 @@ MAX_AVG_WATTS = 10_000
 NCM_LAP_LEN_M = 5040.
 
 
-def windowed_mean(arr: np.ndarray, factor: int, allow_truncate=False) -> np.ndarray:
-    """Returns a new array representing the windowed mean of ``arr``.
+def windowed_means(arr: np.ndarray, factors: list[int]) -> list[np.ndarray]:
+    """Returns the windowed mean of ``arr`` for each of ``factors``, ignoring NaN like ``np.nanmean``.
 
-    :param ndarray arr: The array for which to compute a windowed mean.
-    :param int factor: The number of indices grouped into each window.
-        If ``allow_truncate`` is False, ``arr.size`` must be divisible by ``factor``.
-    :param bool allow_truncate: If true, allow this function to trim the end of ``arr``
-        until it is a multiple of ``factor``.
-    :return: A new array representing the windowed mean of ``arr``.
+    The sum and number of valid values of ``arr`` are reduced once over windows of the greatest common divisor of
+    ``factors``, then each windowed mean is reduced from those, such that ``arr`` is only passed over once however
+    many factors are requested. Any values beyond the last complete window of each factor are discarded.
+
+    :param ndarray arr: The array for which to compute windowed means.
+    :param list[int] factors: The number of indices grouped into each window, for each windowed mean.
+    :return: A new array representing the windowed mean of ``arr``, for each of ``factors``.
     """
     assert arr.ndim == 1, "can only down-sample 1-d array"
-    if allow_truncate:
-        arr = arr[:-(arr.size % factor)]
-    else:
-        assert arr.size % factor == 0, "array length must be a multiple of down-sampling factor"
-    reshaped = np.reshape(arr, (-1, factor))
-    return np.nanmean(reshaped, axis=1)
+    assert all(factor > 0 for factor in factors), "down-sampling factors must be positive"
+
+    if len(factors) == 0:
+        return []
+
+    base_factor = math.gcd(*factors)
+    base_arr = np.reshape(arr[:arr.size - arr.size % base_factor], (-1, base_factor))
+    base_sums = np.nansum(base_arr, axis=1)
+    base_counts = np.count_nonzero(~np.isnan(base_arr), axis=1)
+
+    means = []
+    for factor in factors:
+        num_windows = arr.size // factor
+        windows_per_factor = factor // base_factor
+
+        sums = base_sums[:num_windows * windows_per_factor].reshape(-1, windows_per_factor).sum(axis=1)
+        counts = base_counts[:num_windows * windows_per_factor].reshape(-1, windows_per_factor).sum(axis=1)
+
+        # like np.nanmean, windows without any valid values have a mean of np.nan
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means.append(sums / counts)
+
+    return means
 
 
 class EfficiencyStage(Stage):
@@ -40,7 +60,7 @@ class EfficiencyStage(Stage):
 
     @staticmethod
     def dependencies():
-        return ["ingress", "power"]
+        return ["ingress", "cleanup", "power", "localization"]
 
     @staticmethod
     @task(name="Efficiency")
@@ -50,13 +70,15 @@ class EfficiencyStage(Stage):
             lap_index_loader: FileLoader) -> tuple[FileLoader, ...]:
         """
         Run the efficiency stage, which computes motor energy used per unit distance. Values are computed over various
-        time slices.
+        time slices: over each lap, and over consecutive periods of each of the durations configured in
+        ``efficiency/efficiency_configuration.toml``.
 
         :param self: an instance of EfficiencyStage to be run
         :param FileLoader speed_mps_loader: loader to SpeedMPS from CleanupStage
         :param FileLoader motor_power_loader: loader to Motor Power from PowerStage
         :param FileLoader lap_index_loader: loader to the best available lap index data from LocalizationStage
-        :returns: Efficiency5Minute, Efficiency1Hour, EfficiencyLapDistance (FileLoaders pointing to TimeSeries)
+        :returns: Efficiency<name> for each configured period (Efficiency5Minute and Efficiency1Hour by default),
+            then EfficiencyLapDistance (FileLoaders pointing to TimeSeries)
         """
         return super().run(self, speed_mps_loader, motor_power_loader, lap_index_loader)
 
@@ -72,6 +94,24 @@ class EfficiencyStage(Stage):
 
         self._event = event
 
+    @property
+    def periodic_efficiency_periods(self) -> dict[str, Result]:
+        """
+        The period, in seconds, of each periodic view of efficiency, keyed by the name of the view. Each period is
+        an error if it is not a positive number, such that only that view fails to be computed.
+        """
+        periods = self.stage_data["efficiency_configuration"]["periodic_efficiency"]
+
+        period_results = {}
+        for name, period in periods.items():
+            if isinstance(period, (int, float)) and not isinstance(period, bool) and 0 < period < math.inf:
+                period_results[name] = Result.Ok(float(period))
+            else:
+                period_results[name] = Result.Err(ValueError(f"Period of Efficiency{name} must be a positive number "
+                                                             f"of seconds, not {period!r}!"))
+
+        return period_results
+
     def extract(
             self,
             speed_mps_loader: FileLoader,
@@ -85,35 +125,39 @@ class EfficiencyStage(Stage):
         return speed_mps_result, motor_power_result, lap_index_result
 
     @staticmethod
-    def get_periodic_efficiency(
+    def get_periodic_efficiencies(
             speed_mps_aligned: TimeSeries,
             motor_power_aligned: TimeSeries,
-            period_seconds: float
-    ) -> TimeSeries:
+            periods_seconds: list[float]
+    ) -> list[TimeSeries]:
         # (seconds/window) / (seconds/index) == indices/window
-        downsample_factor = int(period_seconds / speed_mps_aligned.period)
-        speed_mps_averaged: np.ndarray = windowed_mean(
-            np.array(speed_mps_aligned),
-            downsample_factor,
-            allow_truncate=True
-        )
+        downsample_factors = [int(period_seconds / speed_mps_aligned.period) for period_seconds in periods_seconds]
+        speeds_mps_averaged: list[np.ndarray] = windowed_means(np.asarray(speed_mps_aligned), downsample_factors)
+        motor_powers_averaged: list[np.ndarray] = windowed_means(np.asarray(motor_power_aligned), downsample_factors)
 
-        motor_power_averaged: np.ndarray = windowed_mean(
-            np.array(motor_power_aligned),
-            downsample_factor,
-            allow_truncate=True
-        )
+        efficiencies = []
+        for period_seconds, speed_mps_averaged, motor_power_averaged in zip(
+                periods_seconds, speeds_mps_averaged, motor_powers_averaged):
+            efficiency_array = motor_power_averaged / speed_mps_averaged  # (J/s) / (m/s) = J/m
 
-        efficiency_array = motor_power_averaged / speed_mps_averaged  # (J/s) / (m/s) = J/m
+            # clean bad values by setting them to zero
+            bad_values_mask = EfficiencyStage.get_anomaly_mask(motor_power_averaged, speed_mps_averaged)
+            efficiency_array[bad_values_mask] = np.nan
+            efficiency = speed_mps_aligned.promote(efficiency_array)
 
-        # clean bad values by setting them to zero
-        bad_values_mask = EfficiencyStage.get_anomaly_mask(motor_power_averaged, speed_mps_averaged)
-        efficiency_array[bad_values_mask] = np.nan
-        efficiency = speed_mps_aligned.promote(efficiency_array)
+            efficiency.meta['period'] = period_seconds  # important: update the period for this TimeSeries
+            efficiency.units = "J/m"
+            efficiencies.append(efficiency)
 
-        efficiency.meta['period'] = period_seconds  # important: update the period for this TimeSeries
-        efficiency.units = "J/m"
-        return efficiency
+        return efficiencies
+
+    @staticmethod
+    def get_periodic_efficiency(
+            speed_mps_aligned: TimeSeries,
+            motor_power_aligned: TimeSeries,
+            period_seconds: float
+    ) -> TimeSeries:
+        return EfficiencyStage.get_periodic_efficiencies(speed_mps_aligned, motor_power_aligned, [period_seconds])[0]
 
     @staticmethod
     def get_anomaly_mask(motor_power_averaged: np.ndarray, speed_mps_averaged: np.ndarray) -> np.ndarray:
@@ -136,74 +180,79 @@ class EfficiencyStage(Stage):
         :return: efficiency_lap_distance
         """
         lap_index = np.array(lap_index_aligned, dtype=int)
-        vv_aligned_arr = np.array(speed_mps_aligned)
-        mp_aligned_arr = np.array(motor_power_aligned)
+        vv_aligned_arr = np.asarray(speed_mps_aligned)
+        mp_aligned_arr = np.asarray(motor_power_aligned)
         efficiency_lap_distance = np.zeros(int(np.max(lap_index) + 1))
 
-        # iterate over the time indices, and update efficiency_lap_distance every time we roll into a new lap
-        sum_power = 0
-        sum_speed = 0
-        num_vals = 0
-        prev_lap_idx = 0
-        for array_index, lap_idx in enumerate(lap_index):
-            if lap_idx > prev_lap_idx:
-                # start of a new lap
-
-                # determine avg power and speed over the last lap
-                avg_power = sum_power / num_vals
-                avg_speed = sum_speed / num_vals
-
-                # set value to:
-                #     np.nan if the speed or power are outside the acceptable range
-                #     otherwise the efficiency for the last lap
-                if ((avg_speed > MAX_AVG_METERS_PER_SEC) | (avg_speed < MIN_AVG_METERS_PER_SEC)
-                        | (avg_power < MIN_AVG_WATTS) | (avg_power > MAX_AVG_WATTS)):
-                    efficiency_lap_distance[lap_idx] = np.nan  # invalid data
-                else:
-                    efficiency_lap_distance[lap_idx] = avg_power / avg_speed
-
-                # reset the accumulating variables
-                sum_power = 0
-                sum_speed = 0
-                num_vals = 0
-                prev_lap_idx = lap_idx
-
-            # accumulate values so that they can be averaged later
-            sum_power += mp_aligned_arr[array_index]
-            sum_speed += vv_aligned_arr[array_index]
-            num_vals += 1
-
-        return np.array(efficiency_lap_distance)
-
-    def transform(self, speed_mps_result, motor_power_result, lap_index_result) -> tuple[Result, Result, Result]:
+        # a lap only ends once the lap index exceeds every lap index before it, as it can briefly jump backwards,
+        # so each sample belongs to the greatest lap index seen up to and including it
+        lap_of_sample = np.maximum.accumulate(np.maximum(lap_index, 0))
+
+        # accumulate values so that they can be averaged later
+        num_vals = np.bincount(lap_of_sample)
+        sum_power = np.bincount(lap_of_sample, weights=mp_aligned_arr)
+        sum_speed = np.bincount(lap_of_sample, weights=vv_aligned_arr)
+
+        # every lap that was started, in order, where the values of each lap are averaged when the next one starts
+        laps = np.union1d([0], np.flatnonzero(num_vals))
+        previous_laps, new_laps = laps[:-1], laps[1:]
+
+        # determine avg power and speed over each lap, which is only empty if the very first sample starts a lap
+        with np.errstate(invalid="ignore", divide="ignore"):
+            avg_power = sum_power[previous_laps] / num_vals[previous_laps]
+            avg_speed = sum_speed[previous_laps] / num_vals[previous_laps]
+            efficiency = avg_power / avg_speed
+
+        # set value to:
+        #     np.nan if the speed or power are outside the acceptable range
+        #     otherwise the efficiency for the lap that just ended
+        efficiency[EfficiencyStage.get_anomaly_mask(avg_power, avg_speed)] = np.nan  # invalid data
+        efficiency_lap_distance[new_laps] = efficiency
+
+        return efficiency_lap_distance
+
+    def transform(self, speed_mps_result, motor_power_result, lap_index_result) -> tuple[dict[str, Result], Result]:
         try:
             speed_mps_ts: TimeSeries = speed_mps_result.unwrap().data
             motor_power_ts: TimeSeries = motor_power_result.unwrap().data
-            speed_mps_aligned, motor_power_aligned = TimeSeries.align(
-                speed_mps_ts, motor_power_ts)
-
-            efficiency_5min: TimeSeries = self.get_periodic_efficiency(
+            speed_mps_aligned, motor_power_aligned = align(
+                self.event_name, speed_mps_ts, motor_power_ts)
+
+            # views with a period that is invalid, or too short to average over, fail without affecting the others
+            periodic_efficiency_results = {}
+            periods = {}
+            for name, period_result in self.periodic_efficiency_periods.items():
+                try:
+                    period = period_result.unwrap()
+                    if int(period / speed_mps_aligned.period) < 1:
+                        raise ValueError(f"Period of Efficiency{name} ({period:g}s) is shorter than the period of "
+                                         f"SpeedMPS ({speed_mps_aligned.period:g}s)!")
+
+                    periods[name] = period
+
+                except (UnwrappedError, ValueError) as e:
+                    self.logger.error(f"Failed to compute Efficiency{name}! \n {e.__cause__ or e}")
+                    periodic_efficiency_results[name] = Result.Err(RuntimeError(f"Failed to process Efficiency{name}!"))
+
+            periodic_efficiencies: list[TimeSeries] = self.get_periodic_efficiencies(
                 speed_mps_aligned,
                 motor_power_aligned,
-                300
+                list(periods.values())
             )
 
-            efficiency_5min.name = "Efficiency5Minute"
-            efficiency_5min_result = Result.Ok(efficiency_5min)
+            for name, efficiency in zip(periods.keys(), periodic_efficiencies):
+                efficiency.name = f"Efficiency{name}"
+                periodic_efficiency_results[name] = Result.Ok(efficiency)
 
-            efficiency_1h: TimeSeries = self.get_periodic_efficiency(
-                speed_mps_aligned,
-                motor_power_aligned,
-                3600
-            )
-
-            efficiency_1h.name = "Efficiency1Hour"
-            efficiency_1h_result = Result.Ok(efficiency_1h)
+            # in the order of the configuration
+            periodic_efficiency_results = {
+                name: periodic_efficiency_results[name] for name in self.periodic_efficiency_periods.keys()
+            }
 
             try:
                 lap_index = lap_index_result.unwrap().data
-                lap_index_aligned, speed_mps_aligned, motor_power_aligned = TimeSeries.align(
-                    lap_index, speed_mps_ts, motor_power_ts)
+                lap_index_aligned, speed_mps_aligned, motor_power_aligned = align(
+                    self.event_name, lap_index, speed_mps_ts, motor_power_ts)
 
                 efficiency_lap_distance: np.ndarray = self.get_lap_dist_efficiency(
                     speed_mps_aligned,
@@ -217,44 +266,34 @@ class EfficiencyStage(Stage):
 
         except UnwrappedError as e:
             self.logger.error(f"Failed to unwrap result! \n {e}")
-            efficiency_5min_result = Result.Err(RuntimeError("Failed to process Efficiency5Minute!"))
-            efficiency_1h_result = Result.Err(RuntimeError("Failed to process Efficiency1Hour!"))
+            periodic_efficiency_results = {
+                name: Result.Err(RuntimeError(f"Failed to process Efficiency{name}!"))
+                for name in self.periodic_efficiency_periods.keys()
+            }
             efficiency_lap_distance_result = Result.Err(RuntimeError("Failed to process EfficiencyLapDistance!"))
 
-        return efficiency_5min_result, efficiency_1h_result, efficiency_lap_distance_result
+        return periodic_efficiency_results, efficiency_lap_distance_result
 
     def load(self,
-             efficiency_5min_result,
-             efficiency_1h_result,
+             periodic_efficiency_results,
              efficiency_lap_distance_result
-             ) -> tuple[FileLoader, FileLoader, FileLoader]:
-        efficiency_5min_file = File(
-            canonical_path=CanonicalPath(
-                origin=self.context.title,
-                event=self.event_name,
-                source=self.get_stage_name(),
-                name="Efficiency5Minute",
-            ),
-            file_type=FileType.TimeSeries,
-            data=efficiency_5min_result.unwrap() if efficiency_5min_result else None,
-            description="Driving efficiency in J/m, computed as avg_motor_power / avg_speed_mps with values "
-                        "averaged over 5-minute periods. Values are np.nan where mean speed is outside "
-                        "the range [2, 50] m/s or if mean power is outside the range [0, 10] kW."
-        )
-
-        efficiency_1h_file = File(
-            canonical_path=CanonicalPath(
-                origin=self.context.title,
-                event=self.event_name,
-                source=self.get_stage_name(),
-                name="Efficiency1Hour",
-            ),
-            file_type=FileType.TimeSeries,
-            data=efficiency_1h_result.unwrap() if efficiency_1h_result else None,
-            description="Driving efficiency in J/m, computed as avg_motor_power / avg_speed_mps with values "
-                        "averaged over 1-hour periods. Values are np.nan where mean speed is outside "
-                        "the range [2, 50] m/s or if mean power is outside the range [0, 10] kW."
-        )
+             ) -> tuple[FileLoader, ...]:
+        periodic_efficiency_files = [
+            File(
+                canonical_path=CanonicalPath(
+                    origin=self.context.title,
+                    event=self.event_name,
+                    source=self.get_stage_name(),
+                    name=f"Efficiency{name}",
+                ),
+                file_type=FileType.TimeSeries,
+                data=periodic_efficiency_result.unwrap() if periodic_efficiency_result else None,
+                description="Driving efficiency in J/m, computed as avg_motor_power / avg_speed_mps with values "
+                            f"averaged over {periodic_efficiency_result.unwrap().meta['period']:g}-second periods. "
+                            "Values are np.nan where mean speed is outside the range [2, 50] m/s or if mean power is "
+                            "outside the range [0, 10] kW." if periodic_efficiency_result else None
+            ) for name, periodic_efficiency_result in periodic_efficiency_results.items()
+        ]
 
         efficiency_lap_distance_file = File(
             canonical_path=CanonicalPath(
@@ -276,39 +315,29 @@ class EfficiencyStage(Stage):
                         "the range [2, 50] m/s or if mean power is outside the range [0, 10] kW."
         )
 
-        efficiency_5min_loader = self.context.data_source.store(efficiency_5min_file)
-        self.logger.info(f"Successfully loaded Efficiency1Hour!")
-
-        efficiency_1h_loader = self.context.data_source.store(efficiency_1h_file)
-        self.logger.info(f"Successfully loaded Efficiency5Minute!")
+        periodic_efficiency_loaders = []
+        for periodic_efficiency_file in periodic_efficiency_files:
+            periodic_efficiency_loaders.append(self.context.data_source.store(periodic_efficiency_file))
+            self.logger.info(f"Successfully loaded {periodic_efficiency_file.canonical_path.name}!")
 
         efficiency_lap_distance_loader = self.context.data_source.store(efficiency_lap_distance_file)
         self.logger.info(f"Successfully loaded EfficiencyLapDist!")
 
-        return efficiency_5min_loader, efficiency_1h_loader, efficiency_lap_distance_loader
+        return *periodic_efficiency_loaders, efficiency_lap_distance_loader
 
     def skip_stage(self):
-        efficiency_5min_file = File(
-            canonical_path=CanonicalPath(
-                origin=self.context.title,
-                event=self.event_name,
-                source=self.get_stage_name(),
-                name="Efficiency5Minute",
-            ),
-            file_type=FileType.TimeSeries,
-            data=None,
-        )
-
-        efficiency_1h_file = File(
-            canonical_path=CanonicalPath(
-                origin=self.context.title,
-                event=self.event_name,
-                source=self.get_stage_name(),
-                name="Efficiency1Hour",
-            ),
-            file_type=FileType.TimeSeries,
-            data=None,
-        )
+        periodic_efficiency_files = [
+            File(
+                canonical_path=CanonicalPath(
+                    origin=self.context.title,
+                    event=self.event_name,
+                    source=self.get_stage_name(),
+                    name=f"Efficiency{name}",
+                ),
+                file_type=FileType.TimeSeries,
+                data=None,
+            ) for name in self.periodic_efficiency_periods.keys()
+        ]
 
         efficiency_lap_distance_file = File(
             canonical_path=CanonicalPath(
@@ -321,11 +350,11 @@ class EfficiencyStage(Stage):
             data=None,
         )
 
-        efficiency_5min_loader = self.context.data_source.store(efficiency_5min_file)
-        efficiency_1h_loader = self.context.data_source.store(efficiency_1h_file)
+        periodic_efficiency_loaders = [self.context.data_source.store(periodic_efficiency_file)
+                                       for periodic_efficiency_file in periodic_efficiency_files]
         efficiency_lap_distance_loader = self.context.data_source.store(efficiency_lap_distance_file)
 
-        return efficiency_5min_loader, efficiency_1h_loader, efficiency_lap_distance_loader
+        return *periodic_efficiency_loaders, efficiency_lap_distance_loader
 
 
 stage_registry.register_stage(EfficiencyStage.get_stage_name(), EfficiencyStage)
@@ -1,15 +1,29 @@
 from data_tools.schema import FileLoader
 from stage.stage import Stage
 from stage.stage_registry import stage_registry
+from stage.alignment import align
 from data_tools.schema import Result, UnwrappedError, File, FileType, CanonicalPath, Event
 from data_tools.collections import TimeSeries
 from prefect import task
 from scipy.interpolate import CubicSpline
 import numpy as np
-from numpy.typing import NDArray
+import hashlib
+import json
+from numpy.typing import NDArray, ArrayLike
 from typing import Callable
-from physics.models.battery import BatteryModelConfig, KalmanFilterConfig, EquivalentCircuitBatteryModel, \
-    FilteredBatteryModel
+import functools
+import math
+from physics.models.battery import BatteryModelConfig, KalmanFilterConfig, EquivalentCircuitBatteryModel
+from stage.soc_filter import BatchedFilteredBatteryModel
+from stage.integration import CumulativeIntegrator, valid_segments
+
+
+# SOC may be slightly above one, since we may be underestimating battery health
+MIN_SOC = 0.0
+MAX_SOC = 1.1
+
+# Number of SOC values in the table used to invert open-circuit voltage, such that SOC is resolved to 1e-4
+INVERSE_OCV_TABLE_SIZE = 11001
 
 
 class EnergyStage(Stage):
@@ -43,8 +57,7 @@ class EnergyStage(Stage):
             EnergyVOLExtrapolated, then IntegratedPackPower is subtracted from this. This technique of determining
             battery energy is equivalent to 'coulomb counting'. Values may be smoother than EnergyVOLExtrapolated and
             more accurate in the short term, but can diverge from the truth over time as systematic error is integrated.
-            This value is also problematic if telemetry is missing values, as this will appear as if no power was used
-            during this time.
+            Gaps where pack power is missing are bridged by interpolating pack power across them.
         4. UnfilteredSOC
             Estimated SOC of our battery, in dimensionless units in the range [0, 1], by modeling our
             battery as a first-order Thevenin equivalent circuit. The accuracy of this SOC estimation
@@ -55,13 +68,17 @@ class EnergyStage(Stage):
             with an Extended Kalman Filter. Uses terminal voltage measurements to correct for current
             sensor error. Sensitive to variations in the battery state of health since testing used
             to generate the model parameters.
+        6. VoltageSOC
+            Estimated SOC of our battery, in dimensionless units in the range [0, 1], by approximating
+            the open-circuit voltage of the battery by the total pack voltage and inverting the open-circuit
+            voltage curve of the battery model. Only accurate while the battery is relaxed.
 
         :param EnergyStage self: an instance of EnergyStage to be run
         :param FileLoader voltage_of_least_loader: loader to VoltageofLeast from Ingress
         :param FileLoader pack_power_loader: loader to Pack Power from PowerStage
         :param FileLoader total_pack_voltage_loader: loader to TotalPackVoltage from Ingress
         :param FileLoader pack_current_loader: loader to PackCurrent from Ingress
-        :returns: EnergyVOLExtrapolated, IntegratedPackPower, EnergyFromIntegratedPower, UnfilteredSOC, SOC
+        :returns: EnergyVOLExtrapolated, IntegratedPackPower, EnergyFromIntegratedPower, UnfilteredSOC, SOC, VoltageSOC
         """
         return super().run(
             self,
@@ -91,7 +108,7 @@ class EnergyStage(Stage):
             pack_current_loader: FileLoader,
     ) -> tuple[
         Result[File], Result[File], Result[dict], Result[File],
-        Result[File], Result[BatteryModelConfig], Result[KalmanFilterConfig], Result[dict]
+        Result[File], Result[BatteryModelConfig], Result[KalmanFilterConfig], Result[dict], Result[dict]
     ]:
         voltage_of_least_result: Result = voltage_of_least_loader()
         pack_power_result: Result = pack_power_loader()
@@ -111,7 +128,8 @@ class EnergyStage(Stage):
             battery_model_config_result = Result.Ok(BatteryModelConfig(**battery_model_config_data))
 
             try:
-                kalman_filter_config_data = self.stage_data[self.event_name]["kalman_filter_config"]
+                # Copy, so that parsing the configuration doesn't modify the stage data
+                kalman_filter_config_data = dict(self.stage_data[self.event_name]["kalman_filter_config"])
                 kalman_filter_config_data.update({"battery_model_config": battery_model_config_result.unwrap()})
 
                 kalman_filter_config_data["state_covariance_matrix"] = np.array(kalman_filter_config_data["state_covariance_matrix"])
@@ -150,6 +168,9 @@ class EnergyStage(Stage):
                 f"Expected at energy/{self.event_name}/initial_state")
             )
 
+        soc_checkpoint = self._extract_soc_checkpoint()
+        integration_checkpoint = self._extract_integration_checkpoint()
+
         return (
             voltage_of_least_result,
             pack_power_result,
@@ -158,17 +179,135 @@ class EnergyStage(Stage):
             pack_current_result,
             battery_model_config_result,
             kalman_filter_config_result,
-            initial_state
+            initial_state,
+            soc_checkpoint,
+            integration_checkpoint
         )
 
-    @staticmethod
-    def _compute_integrated_pack_power(pack_power: TimeSeries) -> Result[TimeSeries]:
+    def _soc_config_digest(self) -> str:
+        event_stage_data = self.stage_data.get(self.event_name, {})
+        soc_config = {key: event_stage_data.get(key) for key in
+                      ("battery_model_config", "kalman_filter_config", "initial_state")}
+
+        return hashlib.blake2b(json.dumps(soc_config, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _checkpoint_path(self, name: str) -> CanonicalPath:
+        return CanonicalPath(
+            origin=self.context.title,
+            event=self.event_name,
+            source=EnergyStage.get_stage_name(),
+            name=name,
+        )
+
+    def _extract_checkpoint(self, name: str, outputs: tuple[str, ...]) -> dict:
+        """
+        Acquire the checkpoint ``name`` stored at the end of the last run, along with each of ``outputs`` as they
+        were computed by the last run up to the number of samples that were checkpointed.
+
+        :raises RuntimeError: if the checkpoint or any of ``outputs`` could not be acquired
+        :raises UnwrappedError: if the checkpoint or any of ``outputs`` could not be acquired
+        """
+        if not self._event.attributes.get("realtime"):
+            raise RuntimeError(f"{self.event_name} is not a realtime event, so it is not checkpointed.")
+
+        checkpoint: dict = self.context.data_source.get(self._checkpoint_path(name)).unwrap().data
+
+        if checkpoint is None:
+            raise RuntimeError(f"{name} is empty!")
+
+        for output in outputs:
+            output_data = self.context.data_source.get(self._checkpoint_path(output)).unwrap().data
+
+            if output_data is None or len(output_data) < checkpoint["num_samples"]:
+                raise RuntimeError(f"{output} does not match {name}!")
+
+            checkpoint[output] = np.asarray(output_data)[:checkpoint["num_samples"]]
+
+        return checkpoint
+
+    def _extract_soc_checkpoint(self) -> Result[dict]:
+        """
+        Acquire the state of SOC estimation at the end of the last run, along with the SOC estimated so far, such
+        that SOC estimation can resume on only the samples that have arrived since. Only realtime events, whose data
+        grows between runs, are checkpointed.
+        """
+        try:
+            return Result.Ok(self._extract_checkpoint("SOCCheckpoint", ("UnfilteredSOC", "SOC")))
+
+        except (UnwrappedError, RuntimeError) as e:
+            self.logger.info(f"Could not resume SOC estimation from a checkpoint, it will be estimated from the "
+                             f"start of {self.event_name}: {e}")
+            return Result.Err(RuntimeError(f"Could not acquire SOC checkpoint: {e}"))
+
+    def _extract_integration_checkpoint(self) -> Result[dict]:
+        """
+        Acquire the running total of pack power at the end of the last run, along with IntegratedPackPower so far,
+        such that integration can resume on only the samples that have arrived since.
+        """
+        try:
+            return Result.Ok(self._extract_checkpoint("IntegrationCheckpoint", ("IntegratedPackPower",)))
+
+        except (UnwrappedError, RuntimeError) as e:
+            self.logger.info(f"Could not resume integrating pack power from a checkpoint, it will be integrated from "
+                             f"the start of {self.event_name}: {e}")
+            return Result.Err(RuntimeError(f"Could not acquire integration checkpoint: {e}"))
+
+    def _compute_integrated_pack_power(
+            self,
+            pack_power: TimeSeries,
+            checkpoint: dict | None
+    ) -> tuple[TimeSeries, dict]:
+        """
+        Integrate pack power into IntegratedPackPower, streaming it through a ``CumulativeIntegrator`` into a single
+        preallocated array, and resuming from ``checkpoint`` if the last run integrated a prefix of ``pack_power``.
+
+        Gaps of missing pack power are interpolated across. Samples after the last valid sample can only be held at
+        it until more data arrives, so they are integrated but not checkpointed.
+
+        :return: IntegratedPackPower, and a checkpoint from which its integration can be resumed
+        """
         seconds_per_hour = 3600
-        integrated_pack_power_ts = pack_power.promote(np.cumsum(pack_power) * pack_power.period / seconds_per_hour)
+
+        if checkpoint is not None and not _can_resume_integration(checkpoint, pack_power):
+            checkpoint = None
+
+        num_integrated = checkpoint["num_samples"] if checkpoint is not None else 0
+        running_total = checkpoint["running_total"] if checkpoint is not None else 0.0
+        last_valid_sample = checkpoint["last_valid_sample"] if checkpoint is not None else None
+
+        integrated_pack_power = np.empty(len(pack_power))
+        integrated_pack_power[:num_integrated] = checkpoint["IntegratedPackPower"] if checkpoint is not None else []
+
+        new_pack_power = np.asarray(pack_power)[num_integrated:]
+        segments = valid_segments(new_pack_power)
+        num_valid = int(segments[-1, 1]) if len(segments) > 0 else 0
+
+        num_missing = len(new_pack_power) - np.sum(segments[:, 1] - segments[:, 0])
+        if num_missing > 0:
+            self.logger.warning(f"Pack power is missing {num_missing} samples "
+                                f"({num_missing * pack_power.period:.1f} s), which are interpolated across.")
+
+        integrator = CumulativeIntegrator(pack_power.period, seconds_per_hour, running_total, last_valid_sample)
+        integrator.integrate(new_pack_power[:num_valid], out=integrated_pack_power[num_integrated:][:num_valid],
+                             segments=segments)
+
+        integration_checkpoint = {
+            "start": pack_power.start.isoformat(),
+            "period": pack_power.period,
+            "last_sample_time": _sample_time(pack_power, num_integrated + num_valid - 1),
+            "num_samples": num_integrated + num_valid,
+            "running_total": integrator.running_total,
+            "last_valid_sample": integrator.last_valid_sample,
+        }
+
+        integrator.integrate(new_pack_power[num_valid:], out=integrated_pack_power[num_integrated:][num_valid:],
+                             segments=segments[:0])
+
+        integrated_pack_power_ts = pack_power.promote(integrated_pack_power)
         integrated_pack_power_ts.name = "IntegratedPackPower"
         integrated_pack_power_ts.units = "Wh"
 
-        return integrated_pack_power_ts
+        return integrated_pack_power_ts, integration_checkpoint
 
     @staticmethod
     def _compute_energy_vol_extrapolated(
@@ -179,7 +318,10 @@ class EnergyStage(Stage):
         cells_in_module = battery_configuration["cells_in_module"]
         modules_in_pack = battery_configuration["modules_in_pack"]
 
-        vol_cell_wh_from_voltage: Callable = CubicSpline(voltage_wh_lookup[0], voltage_wh_lookup[1])
+        vol_cell_wh_from_voltage: Callable = voltage_wh_interpolant(
+            voltage_wh_lookup,
+            battery_configuration.get("voltage_wh_dense_lookup_step")
+        )
         vol_cell_wh = vol_cell_wh_from_voltage(voltage_of_least)
         energy_vol_extrapolated_ts: TimeSeries = voltage_of_least.promote(
             vol_cell_wh * cells_in_module * modules_in_pack)
@@ -195,8 +337,10 @@ class EnergyStage(Stage):
             integrated_pack_power_ts: TimeSeries
     ) -> Result[TimeSeries]:
         initial_energy = energy_vol_extrapolated_ts[0]
-        energy_from_integrated_power_ts = energy_vol_extrapolated_ts.promote(
-            np.ones(integrated_pack_power_ts.size) * initial_energy - integrated_pack_power_ts)
+        energy_from_integrated_power = np.empty(integrated_pack_power_ts.size)
+        np.subtract(initial_energy, np.asarray(integrated_pack_power_ts), out=energy_from_integrated_power)
+
+        energy_from_integrated_power_ts = energy_vol_extrapolated_ts.promote(energy_from_integrated_power)
         energy_from_integrated_power_ts.name = "EnergyFromIntegratedPower"
         energy_from_integrated_power_ts.units = "Wh"
         energy_from_integrated_power = Result.Ok(energy_from_integrated_power_ts)
@@ -212,17 +356,25 @@ class EnergyStage(Stage):
             pack_current_result: Result[File],
             battery_model_config_result: Result[BatteryModelConfig],
             kalman_filter_config_result: Result[KalmanFilterConfig],
-            initial_state_result: Result[dict]
-    ) -> tuple[Result, Result, Result, Result, Result]:
+            initial_state_result: Result[dict],
+            soc_checkpoint_result: Result[dict],
+            integration_checkpoint_result: Result[dict]
+    ) -> tuple[Result, Result, Result, Result, Result, Result, Result, Result]:
         # First, we need pack_power to compute integrated_pack_power
         try:
             pack_power: TimeSeries = pack_power_result.unwrap().data
-            integrated_pack_power: Result[TimeSeries] = Result.Ok(self._compute_integrated_pack_power(pack_power))
+            integrated_pack_power_ts, integration_checkpoint_data = self._compute_integrated_pack_power(
+                pack_power,
+                integration_checkpoint_result.unwrap() if integration_checkpoint_result else None
+            )
+            integrated_pack_power: Result[TimeSeries] = Result.Ok(integrated_pack_power_ts)
+            integration_checkpoint: Result[dict] = Result.Ok(integration_checkpoint_data)
 
         except UnwrappedError as e:
             error_cause = f"Failed to unwrap pack power result! \n {e}"
             self.logger.error(error_cause)
             integrated_pack_power: Result[TimeSeries] = Result.Err(RuntimeError(error_cause))
+            integration_checkpoint: Result[dict] = Result.Err(RuntimeError(error_cause))
 
         # Next, try to use battery_configuration and voltage_of_least to compute energy_vol_extrapolated
         try:
@@ -262,6 +414,8 @@ class EnergyStage(Stage):
             energy_from_integrated_power = Result.Err(RuntimeError(error_reason))
 
         # To compute SOC, we need total_pack_voltage, pack_current, initial_state, and battery_model_config
+        soc_checkpoint: Result[dict] = Result.Err(RuntimeError("SOC was not estimated, so it was not checkpointed!"))
+
         try:
             total_pack_voltage: TimeSeries = total_pack_voltage_result.unwrap().data
             raw_pack_current: TimeSeries = pack_current_result.unwrap().data
@@ -271,46 +425,104 @@ class EnergyStage(Stage):
 
             battery_model_config = battery_model_config_result.unwrap()
 
-            total_pack_voltage, pack_current = TimeSeries.align(total_pack_voltage, pack_current)
+            total_pack_voltage, pack_current = align(self.event_name, total_pack_voltage, pack_current)
+
+            # Approximating Uoc by the terminal voltage, as we do for the initial SOC, gives a crude but
+            # instantaneous estimate of SOC at every sample
+            voltage_soc = Result.Ok(into_soc_timeseries(
+                inverse_ocv(battery_model_config, total_pack_voltage),
+                total_pack_voltage
+            ))
+
+            # If SOC was checkpointed by the last run, we only need to estimate it for the samples that came after
+            soc_config_digest = self._soc_config_digest()
+            checkpoint: dict | None = soc_checkpoint_result.unwrap() if soc_checkpoint_result else None
+
+            if checkpoint is not None and not _can_resume_soc(checkpoint, soc_config_digest, total_pack_voltage):
+                self.logger.info("SOC checkpoint does not match the current data or configuration, so SOC will "
+                                 f"be estimated from the start of {self.event_name}.")
+                checkpoint = None
+
+            if checkpoint is not None:
+                num_estimated = checkpoint["num_samples"]
+                initial_soc = checkpoint["initial_soc"]
+                unfiltered_state = checkpoint["unfiltered"]
+
+                self.logger.info(f"Resuming SOC estimation from a checkpoint with "
+                                 f"{len(pack_current) - num_estimated} new samples.")
 
             # If we can't get initial state, grab it using the first voltage measurement using
             # the assumption that when the car starts up the battery will be pretty relaxed,
             # so Uoc is approximated by the terminal voltage
-            if not initial_state_result:
-                Uoc_from_SOC = battery_model_config.get_Uoc
-                initial_soc = binary_search_inverse(
-                    Uoc_from_SOC,
-                    total_pack_voltage[0],
-                    a=0.0, b=1.1,  # 0.0 < SOC < 1.1, since we may be underestimating battery health
-                    max_iter=50
-                )
+            elif not initial_state_result:
+                initial_soc = float(inverse_ocv(battery_model_config, total_pack_voltage[0]))
 
             else:
                 initial_state = initial_state_result.unwrap()
                 initial_soc = initial_state["state"]["initial_soc"]
 
-            battery_model = EquivalentCircuitBatteryModel(battery_model_config, initial_soc)
-            unfiltered_soc_array, _ = battery_model.update_array(pack_current.period, current_array=-pack_current)
+            if checkpoint is None:
+                num_estimated = 0
+                unfiltered_state = {"SOC": initial_soc, "U_P": 0.0}
+
+            new_total_pack_voltage = np.asarray(total_pack_voltage)[num_estimated:]
+            new_pack_current = np.asarray(pack_current)[num_estimated:]
+
+            battery_model = EquivalentCircuitBatteryModel(battery_model_config, unfiltered_state["SOC"])
+            _set_polarization_potential(battery_model, unfiltered_state["U_P"])
+            new_unfiltered_soc_array, new_terminal_voltage_array = battery_model.update_array(
+                pack_current.period,
+                current_array=-new_pack_current
+            )
+
+            if len(new_pack_current) > 0:
+                unfiltered_state = {
+                    "SOC": float(new_unfiltered_soc_array[-1]),
+                    "U_P": _final_polarization_potential(
+                        battery_model,
+                        new_unfiltered_soc_array[-2] if len(new_pack_current) > 1 else unfiltered_state["SOC"],
+                        -new_pack_current[-1],
+                        new_terminal_voltage_array[-1]
+                    )
+                }
+
+            unfiltered_soc_array = np.empty(len(pack_current))
+            unfiltered_soc_array[:num_estimated] = checkpoint["UnfilteredSOC"] if checkpoint is not None else []
+            unfiltered_soc_array[num_estimated:] = new_unfiltered_soc_array
             unfiltered_soc = Result.Ok(into_soc_timeseries(unfiltered_soc_array, pack_current))
 
             # To compute filtered SOC, we also need kalman_filter_config
             try:
                 kalman_filter_config = kalman_filter_config_result.unwrap()
-                filtered_battery_model = FilteredBatteryModel(kalman_filter_config, initial_soc)
 
-                SOC_array = np.zeros_like(pack_current)
-                dt = total_pack_voltage.period
+                if checkpoint is not None:
+                    filtered_battery_model = BatchedFilteredBatteryModel.from_state(kalman_filter_config,
+                                                                                    checkpoint["filter"])
+                else:
+                    filtered_battery_model = BatchedFilteredBatteryModel(kalman_filter_config, initial_soc)
 
                 self.logger.info("Computing filtered SOC...")
 
-                for i, (voltage, current) in enumerate(zip(total_pack_voltage, pack_current)):
-                    filtered_battery_model.predict_then_update(voltage, current, dt)
-
-                    SOC_array[i] = filtered_battery_model.SOC
+                SOC_array = np.empty(len(pack_current))
+                SOC_array[:num_estimated] = checkpoint["SOC"] if checkpoint is not None else []
+                filtered_battery_model.filter(new_total_pack_voltage, new_pack_current, total_pack_voltage.period,
+                                              out=SOC_array[num_estimated:])
 
                 self.logger.info(f"Finished computing filtered SOC! Final SOC: {SOC_array[-1]:.3f}")
                 soc = Result.Ok(into_soc_timeseries(SOC_array, pack_current))
 
+                soc_checkpoint = Result.Ok({
+                    "config": soc_config_digest,
+                    "start": total_pack_voltage.start.isoformat(),
+                    "stop": total_pack_voltage.stop.isoformat(),
+                    "period": total_pack_voltage.period,
+                    "last_sample_time": _sample_time(total_pack_voltage, len(pack_current) - 1),
+                    "num_samples": len(pack_current),
+                    "initial_soc": float(initial_soc),
+                    "unfiltered": unfiltered_state,
+                    "filter": filtered_battery_model.get_state(),
+                })
+
             except UnwrappedError as e:
                 error_reason = f"Failed to compute filtered SOC! \n {e}"
                 self.logger.error(error_reason)
@@ -321,8 +533,10 @@ class EnergyStage(Stage):
             self.logger.error(error_reason)
             unfiltered_soc = Result.Err(RuntimeError(error_reason))
             soc = Result.Err(RuntimeError(error_reason))
+            voltage_soc = Result.Err(RuntimeError(error_reason))
 
-        return integrated_pack_power, energy_vol_extrapolated, energy_from_integrated_power, unfiltered_soc, soc
+        return (integrated_pack_power, energy_vol_extrapolated, energy_from_integrated_power, unfiltered_soc, soc,
+                voltage_soc, soc_checkpoint, integration_checkpoint)
 
     def load(
             self,
@@ -330,8 +544,11 @@ class EnergyStage(Stage):
             energy_vol_extrapolated,
             energy_from_integrated_power,
             unfiltered_soc,
-            soc
-    ) -> tuple[FileLoader, FileLoader, FileLoader, FileLoader, FileLoader]:
+            soc,
+            voltage_soc,
+            soc_checkpoint,
+            integration_checkpoint
+    ) -> tuple[FileLoader, FileLoader, FileLoader, FileLoader, FileLoader, FileLoader]:
         integrated_pack_power_file = File(
             canonical_path=CanonicalPath(
                 origin=self.context.title,
@@ -370,9 +587,8 @@ class EnergyStage(Stage):
                         "value of EnergyVOLExtrapolated, then IntegratedPackPower is subtracted from this. "
                         "This technique of determining battery energy is equivalent to 'coulomb counting'. "
                         "Values may be smoother than EnergyVOLExtrapolated and more accurate in the short term, "
-                        "but can diverge from the truth over time as systematic error is integrated."
-                        "This value is also problematic if telemetry is missing values, as this will "
-                        "appear as if no power was used during this time."
+                        "but can diverge from the truth over time as systematic error is integrated. "
+                        "Gaps where pack power is missing are bridged by interpolating pack power across them."
         )
 
         unfiltered_soc_file = File(
@@ -405,6 +621,22 @@ class EnergyStage(Stage):
                         "to generate the model parameters."
         )
 
+        voltage_soc_file = File(
+            canonical_path=CanonicalPath(
+                origin=self.context.title,
+                event=self.event_name,
+                source=EnergyStage.get_stage_name(),
+                name="VoltageSOC",
+            ),
+            file_type=FileType.TimeSeries,
+            data=voltage_soc.unwrap() if voltage_soc else None,
+            description="Estimated SOC of our battery, in dimensionless units in the range [0, 1], by approximating "
+                        "the open-circuit voltage of our battery by the total pack voltage and inverting the "
+                        "open-circuit voltage curve of the battery model. Only accurate when the battery is "
+                        "relaxed, as it ignores the voltage across the internal resistance and polarization of "
+                        "the battery under load."
+        )
+
         integrated_pack_power_loader = self.context.data_source.store(integrated_pack_power_file)
         self.logger.info(f"Successfully loaded IntegratedPackPower!")
 
@@ -420,12 +652,34 @@ class EnergyStage(Stage):
         soc_loader = self.context.data_source.store(soc_file)
         self.logger.info(f"Successfully loaded SOC!")
 
+        voltage_soc_loader = self.context.data_source.store(voltage_soc_file)
+        self.logger.info(f"Successfully loaded VoltageSOC!")
+
+        # Realtime events are processed again as their data grows, so keep what we need to resume SOC estimation
+        if soc_checkpoint and self._event.attributes.get("realtime"):
+            self.context.data_source.store(File(
+                canonical_path=self._checkpoint_path("SOCCheckpoint"),
+                file_type=FileType.Any,
+                data=soc_checkpoint.unwrap(),
+                description="The state of SOC estimation at the end of the last run, from which it can be resumed."
+            ))
+
+        if integration_checkpoint and self._event.attributes.get("realtime"):
+            self.context.data_source.store(File(
+                canonical_path=self._checkpoint_path("IntegrationCheckpoint"),
+                file_type=FileType.Any,
+                data=integration_checkpoint.unwrap(),
+                description="The running total of pack power at the end of the last run, from which "
+                            "IntegratedPackPower can be resumed."
+            ))
+
         return (
             integrated_pack_power_loader,
             energy_vol_extrapolated_loader,
             energy_from_integrated_power_loader,
             unfiltered_soc_loader,
-            soc_loader
+            soc_loader,
+            voltage_soc_loader
         )
 
     def skip_stage(self):
@@ -484,21 +738,123 @@ class EnergyStage(Stage):
             data=None,
         )
 
+        voltage_soc_file = File(
+            canonical_path=CanonicalPath(
+                origin=self.context.title,
+                event=self.event_name,
+                source=EnergyStage.get_stage_name(),
+                name="VoltageSOC",
+            ),
+            file_type=FileType.TimeSeries,
+            data=None,
+        )
+
         integrated_pack_power_loader = self.context.data_source.store(integrated_pack_power_file)
         energy_vol_extrapolated_loader = self.context.data_source.store(energy_vol_extrapolated_file)
         energy_from_integrated_power_loader = self.context.data_source.store(energy_from_integrated_power_file)
         unfiltered_soc_loader = self.context.data_source.store(unfiltered_soc_file)
         soc_loader = self.context.data_source.store(soc_file)
+        voltage_soc_loader = self.context.data_source.store(voltage_soc_file)
 
         return (
             integrated_pack_power_loader,
             energy_vol_extrapolated_loader,
             energy_from_integrated_power_loader,
             unfiltered_soc_loader,
-            soc_loader
+            soc_loader,
+            voltage_soc_loader
         )
 
 
+# How far, in seconds, the time of a checkpointed sample may move before the checkpoint is no longer on the same
+# temporal axis as the data, which is well below the resolution of the timestamps that the data is queried with
+CHECKPOINT_TIME_TOLERANCE = 1e-6
+
+
+def _sample_time(time_series: TimeSeries, index: int) -> float:
+    """
+    Get the UNIX timestamp of the sample of ``time_series`` at ``index``, which is the start of ``time_series`` if
+    ``index`` is not positive.
+
+    The samples of a TimeSeries are spread evenly across its length, which is not exactly its nominal period apart
+    once it has been aligned, and changes as the TimeSeries grows.
+    """
+    if index <= 0:
+        return time_series.start.timestamp()
+
+    return time_series.start.timestamp() + index * time_series.length / (len(time_series) - 1)
+
+
+def _is_same_temporal_axis(checkpoint: dict, time_series: TimeSeries) -> bool:
+    """
+    Determine if the samples of ``time_series`` up to the number of samples that were checkpointed are at the same
+    times as they were when ``checkpoint`` was made.
+    """
+    return (checkpoint["start"] == time_series.start.isoformat() and
+            checkpoint["num_samples"] <= len(time_series) and
+            "last_sample_time" in checkpoint and
+            math.isclose(checkpoint["last_sample_time"], _sample_time(time_series, checkpoint["num_samples"] - 1),
+                         rel_tol=0.0, abs_tol=CHECKPOINT_TIME_TOLERANCE))
+
+
+def _can_resume_soc(checkpoint: dict, soc_config_digest: str, total_pack_voltage: TimeSeries) -> bool:
+    """
+    Determine if SOC estimation can resume from ``checkpoint``, which is only possible if SOC is being estimated
+    with the same configuration and the data has grown along the same temporal axis since it was checkpointed.
+    """
+    return checkpoint["config"] == soc_config_digest and _is_same_temporal_axis(checkpoint, total_pack_voltage)
+
+
+def _can_resume_integration(checkpoint: dict, pack_power: TimeSeries) -> bool:
+    """
+    Determine if integrating ``pack_power`` can resume from ``checkpoint``, which is only possible if the data has
+    grown along the same temporal axis since it was checkpointed.
+    """
+    return _is_same_temporal_axis(checkpoint, pack_power)
+
+
+def _battery_model_internal(battery_model: EquivalentCircuitBatteryModel, name: str):
+    """
+    Get the private attribute ``name`` of ``battery_model``, which physics does not expose but resuming the model
+    from a checkpoint depends on.
+
+    :raises RuntimeError: if ``battery_model`` no longer has ``name``, such as after physics has been updated
+    """
+    if not hasattr(battery_model, name):
+        raise RuntimeError(f"EquivalentCircuitBatteryModel no longer has {name}, which SOC checkpoints depend on! "
+                           f"The installed version of physics is not supported.")
+
+    return getattr(battery_model, name)
+
+
+def _set_polarization_potential(battery_model: EquivalentCircuitBatteryModel, polarization_potential: float) -> None:
+    """
+    Resume ``battery_model`` from ``polarization_potential``, which it can't be constructed with.
+
+    :raises RuntimeError: if ``battery_model`` no longer stores its polarization potential as expected
+    """
+    _battery_model_internal(battery_model, "_U_P")
+    battery_model._U_P = polarization_potential
+
+
+def _final_polarization_potential(
+        battery_model: EquivalentCircuitBatteryModel,
+        previous_soc: float,
+        current: float,
+        terminal_voltage: float
+) -> float:
+    """
+    Recover the polarization potential of ``battery_model`` after the last step of ``update_array``, which isn't
+    exposed, from the terminal voltage of that step, U_L = U_oc + U_P + I * R_0.
+
+    :raises RuntimeError: if ``battery_model`` no longer exposes its parameters as expected
+    """
+    U_oc = _battery_model_internal(battery_model, "_U_oc")
+    R_0 = _battery_model_internal(battery_model, "_R_0")
+
+    return float(terminal_voltage - U_oc(previous_soc) - current * R_0(previous_soc))
+
+
 def into_soc_timeseries(values: NDArray, reference: TimeSeries) -> TimeSeries:
     values_ts = reference.promote(values)
     values_ts.units = ""
@@ -507,43 +863,84 @@ def into_soc_timeseries(values: NDArray, reference: TimeSeries) -> TimeSeries:
     return values_ts
 
 
-def binary_search_inverse(
-    f: Callable[[float], float],
-    target: float,
-    a: float = 0.0,
-    b: float = 1.0,
-    rel_tol: float =1e-3,
-    max_iter: int = 50
-):
+class DenseLookup:
     """
-    Solve f(x) = target for x ∈ [a,b], assuming f is strictly decreasing.
-    Stop when |f(mid) - target| / |target| <= rel_tol or after max_iter.
-    Uses a binary search.
+    A cubic spline tabulated at a uniform step across the range of its knots, and evaluated by linearly
+    interpolating between the two nearest entries of the table, which can be found without a search.
+
+    Values outside the range of the knots are evaluated, or rather extrapolated, by the cubic spline itself.
     """
-    fa = f(a)
-    fb = f(b)
-    if not (fb >= target >= fa):
-        raise ValueError("Bracket [a, b] does not contain target because "
-                         "f(a), f(b) are not on opposite sides of target.")
-
-    low, high = a, b
-    for i in range(max_iter):
-        mid = 0.5 * (low + high)
-        fmid = f(mid)
-
-        # Check relative error in y
-        if abs(fmid - target) <= rel_tol * abs(target):
-            return mid
-
-        # Because f is decreasing: f(low) > f(high).
-        # If f(mid) > target, mid is "too low" -> move low up.
-        if fmid < target:
-            low = mid
-        else:
-            high = mid
-
-    # If we exit loop, return the midpoint anyway
-    return 0.5 * (low + high)
+    def __init__(self, spline: CubicSpline, step: float):
+        self._spline = spline
+        self._start, self._stop = float(spline.x[0]), float(spline.x[-1])
+        self._step = step
+
+        num_intervals = math.ceil((self._stop - self._start) / step)
+        self._x = self._start + step * np.arange(num_intervals + 1)
+        self._values = spline(self._x)
+        self._slopes = np.diff(self._values) / step
+
+    def __call__(self, x: ArrayLike) -> NDArray:
+        x = np.asarray(x, dtype=float)
+
+        index = np.clip(((x - self._start) / self._step).astype(np.intp), 0, len(self._slopes) - 1)
+        values = self._values[index] + (x - self._x[index]) * self._slopes[index]
+
+        is_outside = (x < self._start) | (x > self._stop)
+        if np.any(is_outside):
+            values[is_outside] = self._spline(x[is_outside])
+
+        return values
+
+
+@functools.lru_cache(maxsize=8)
+def _voltage_wh_interpolant(voltages: tuple[float, ...], energies: tuple[float, ...],
+                            dense_lookup_step: float | None) -> Callable[[ArrayLike], NDArray]:
+    spline = CubicSpline(voltages, energies)
+
+    return spline if dense_lookup_step is None else DenseLookup(spline, dense_lookup_step)
+
+
+def voltage_wh_interpolant(voltage_wh_lookup: list[list[float]],
+                           dense_lookup_step: float = None) -> Callable[[ArrayLike], NDArray]:
+    """
+    Obtain the cubic spline interpolating a table of cell voltage against cell energy. Interpolants are built
+    once for each distinct table, and shared by every event that uses it.
+
+    :param voltage_wh_lookup: cell voltages and the cell energies at each of them, in V and Wh
+    :param dense_lookup_step: if given, evaluate the spline by interpolating a dense table of it with this step, in
+        Volts, which is faster at the cost of a small error
+    :return: a map from cell voltage to cell energy, which may be evaluated on arrays
+    """
+    voltages, energies = voltage_wh_lookup
+
+    return _voltage_wh_interpolant(tuple(voltages), tuple(energies), dense_lookup_step)
+
+
+@functools.lru_cache(maxsize=32)
+def _inverse_ocv_table(U_oc_coefficients: tuple[float, ...]) -> tuple[NDArray, NDArray]:
+    soc_values = np.linspace(MIN_SOC, MAX_SOC, INVERSE_OCV_TABLE_SIZE)
+
+    # Uoc should increase with SOC, but enforce it so that the table can always be interpolated
+    U_oc_values = np.maximum.accumulate(np.polyval(U_oc_coefficients, soc_values))
+
+    return U_oc_values, soc_values
+
+
+def inverse_ocv(battery_model_config: BatteryModelConfig, voltage: ArrayLike) -> NDArray | float:
+    """
+    Invert the open-circuit voltage curve of ``battery_model_config`` to estimate SOC from ``voltage``, by
+    interpolating a table of Uoc against SOC that is built once for each distinct curve.
+
+    Voltages above or below the curve are clamped to the SOC at either end of it, ``MAX_SOC`` and ``MIN_SOC``.
+
+    :param BatteryModelConfig battery_model_config: battery model whose open-circuit voltage curve will be inverted
+    :param voltage: an open-circuit voltage, or an array of them, in Volts
+    :return: the SOC at which the battery would have each open-circuit voltage
+    """
+    U_oc_values, soc_values = _inverse_ocv_table(tuple(battery_model_config._U_oc_coefficients.tolist()))
+
+    return np.interp(voltage, U_oc_values, soc_values)
 
 
 stage_registry.register_stage(EnergyStage.get_stage_name(), EnergyStage)
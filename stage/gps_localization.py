@@ -0,0 +1,215 @@
+from numpy.typing import NDArray
+from scipy.spatial import cKDTree
+import numpy as np
+
+
+# WGS 84 ellipsoid
+WGS84_SEMI_MAJOR_AXIS_M = 6378137.0
+WGS84_ECCENTRICITY_SQUARED = 6.69437999014e-3
+
+# How far beyond their reach, in meters, track indices are searched for, such that rounding never excludes one that is
+# within reach before it is checked exactly
+REACH_SLACK_M = 1e-6
+
+
+def geodetic_to_ecef(lat_deg: NDArray, lon_deg: NDArray) -> NDArray:
+    """
+    Convert geodetic coordinates on the surface of the WGS 84 ellipsoid into earth-centered, earth-fixed (ECEF)
+    coordinates.
+
+    :param lat_deg: latitudes, in degrees
+    :param lon_deg: longitudes, in degrees
+    :return: ECEF coordinates in meters, of dimension (..., 3)
+    """
+    lat, lon = np.radians(lat_deg), np.radians(lon_deg)
+    sin_lat = np.sin(lat)
+
+    prime_vertical_radius = WGS84_SEMI_MAJOR_AXIS_M / np.sqrt(1 - WGS84_ECCENTRICITY_SQUARED * sin_lat ** 2)
+
+    return np.stack([
+        prime_vertical_radius * np.cos(lat) * np.cos(lon),
+        prime_vertical_radius * np.cos(lat) * np.sin(lon),
+        prime_vertical_radius * (1 - WGS84_ECCENTRICITY_SQUARED) * sin_lat,
+    ], axis=-1)
+
+
+def geodetic_to_enu(lat_deg: NDArray, lon_deg: NDArray, origin_lat_deg: float, origin_lon_deg: float) -> NDArray:
+    """
+    Project geodetic coordinates into the local east-north-up (ENU) frame tangent to the WGS 84 ellipsoid at an
+    origin, in which distances near the origin are in meters. The up component is discarded.
+
+    :param lat_deg: latitudes, in degrees
+    :param lon_deg: longitudes, in degrees
+    :param origin_lat_deg: latitude of the origin of the frame, in degrees
+    :param origin_lon_deg: longitude of the origin of the frame, in degrees
+    :return: east/north coordinates in meters, of dimension (..., 2)
+    """
+    offsets = geodetic_to_ecef(lat_deg, lon_deg) - geodetic_to_ecef(origin_lat_deg, origin_lon_deg)
+
+    origin_lat, origin_lon = np.radians(origin_lat_deg), np.radians(origin_lon_deg)
+    east_axis = np.array([-np.sin(origin_lon), np.cos(origin_lon), 0.0])
+    north_axis = np.array([
+        -np.sin(origin_lat) * np.cos(origin_lon),
+        -np.sin(origin_lat) * np.sin(origin_lon),
+        np.cos(origin_lat)
+    ])
+
+    return np.stack([offsets @ east_axis, offsets @ north_axis], axis=-1)
+
+
+class TrackFrame:
+    """
+    A closed track projected into the local east-north-up (ENU) frame at its centroid, along with a spatial index
+    over its track indices, such that GPS coordinates can be located along the track by distances in meters.
+
+    Track indices are snapped by continuity: each GPS sample is assumed to be near the track index of the sample
+    before it, which prevents spurious jumps between parts of the track that are close together.
+    """
+    def __init__(self, coords: NDArray):
+        """
+        :param coords: lat/lon coordinates of each track index in degrees, of dimension (n_track_indices, 2)
+        """
+        self._origin = np.mean(coords, axis=0)
+        self._points = geodetic_to_enu(coords[:, 0], coords[:, 1], *self._origin)
+        self._tree = cKDTree(self._points)
+
+        # the track is closed, so the last track index leads back to the first
+        self._segments = np.roll(self._points, -1, axis=0) - self._points
+        segment_lengths = np.linalg.norm(self._segments, axis=1)
+        self._distances_along_track = np.concatenate([[0.0], np.cumsum(segment_lengths)[:-1]])
+        self._track_length = float(np.sum(segment_lengths))
+        self._longest_segment_length = float(np.max(segment_lengths))
+
+    @property
+    def track_length(self) -> float:
+        """
+        The length of the track, in meters.
+        """
+        return self._track_length
+
+    def project(self, lat: NDArray, lon: NDArray) -> NDArray:
+        """
+        Project GPS coordinates into the frame of this track.
+
+        :return: east/north coordinates in meters, of dimension (t, 2)
+        """
+        return geodetic_to_enu(np.asarray(lat), np.asarray(lon), *self._origin)
+
+    def separation_along_track(self, track_index: int | NDArray, other_track_index: int | NDArray) -> NDArray:
+        """
+        Distance along the track between two track indices in meters, in whichever direction is shorter.
+        """
+        separation = np.abs(self._distances_along_track[track_index] - self._distances_along_track[other_track_index])
+        return np.minimum(separation, self._track_length - separation)
+
+    def track_indices_within(self, track_index: int, reach: float) -> NDArray:
+        """
+        The track indices within ``reach`` meters along the track of ``track_index``, in ascending order. They are
+        found by binary search over the distance along the track of each track index, wrapping around the end of the
+        track, so only the track indices near ``track_index`` are ever visited.
+        """
+        distances_along_track = self._distances_along_track
+        num_track_indices = len(distances_along_track)
+
+        distance = distances_along_track[track_index]
+        lower, upper = distance - reach - REACH_SLACK_M, distance + reach + REACH_SLACK_M
+
+        if upper - lower >= self._track_length:
+            candidates = np.arange(num_track_indices)
+
+        else:
+            # the track is closed, so a window past either end of the track continues from the other end
+            lower_index = np.searchsorted(distances_along_track, lower % self._track_length, side="left")
+            upper_index = np.searchsorted(distances_along_track, upper % self._track_length, side="right")
+
+            if lower_index <= upper_index and 0 <= lower and upper < self._track_length:
+                candidates = np.arange(lower_index, upper_index)
+            else:
+                candidates = np.concatenate([np.arange(upper_index), np.arange(lower_index, num_track_indices)])
+
+        return candidates[self.separation_along_track(candidates, track_index) <= reach]
+
+    def cross_track_error(self, points: NDArray, track_indices: NDArray) -> NDArray:
+        """
+        Distance from each point to the track, near its track index, in meters. This is the distance to the closer
+        of the two segments of the track on either side of the track index.
+
+        :param points: east/north coordinates in meters, of dimension (t, 2)
+        :param track_indices: the track index of each point
+        :return: cross-track error of each point
+        """
+        def distance_to_segment(segment_indices: NDArray) -> NDArray:
+            starts, segments = self._points[segment_indices], self._segments[segment_indices]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                fractions = np.einsum("ij,ij->i", points - starts, segments) / np.einsum("ij,ij->i", segments, segments)
+
+            # the closest point of a segment without any length is its start
+            fractions = np.clip(np.nan_to_num(fractions), 0, 1)
+            return np.linalg.norm(points - (starts + fractions[:, np.newaxis] * segments), axis=1)
+
+        previous_segment_indices = (track_indices - 1) % len(self._points)
+        return np.minimum(distance_to_segment(previous_segment_indices), distance_to_segment(track_indices))
+
+    def localize(self, lat: NDArray, lon: NDArray, max_step_m: float,
+                 reacquire_distance_m: float) -> tuple[NDArray, NDArray]:
+        """
+        Locate GPS coordinates along the track.
+
+        Each sample is snapped to the closest track index within reach of the track index of the sample before it, which
+        is ``max_step_m`` along the track plus the longest segment of the track, since the closest track index can
+        change by up to a segment more than the car has moved. The closest track index along the whole track is found
+        with the spatial index, and only samples where it is out of reach are searched near the previous track index, by
+        binary search over the distance along the track, such that each of them takes O(log n + k) time for the k track
+        indices within reach rather than O(n). If a sample is closer to the track elsewhere than to the track near the
+        previous track index by more than ``reacquire_distance_m``, such as after leaving the pits, it is snapped to the
+        closest track index instead.
+
+        :param lat: latitudes in degrees, of dimension (t)
+        :param lon: longitudes in degrees, of dimension (t)
+        :param max_step_m: the farthest the car can travel along the track between samples, in meters
+        :param reacquire_distance_m: how much closer the track elsewhere must be to not enforce continuity, in meters
+        :return: the track index of each sample, and its cross-track error in meters (np.nan without a position)
+        """
+        points = self.project(lat, lon)
+        is_valid = np.all(np.isfinite(points), axis=1)
+        valid_points = points[is_valid]
+
+        nearest_distances, nearest_track_indices = self._tree.query(valid_points)
+        snapped_track_indices = np.array(nearest_track_indices, dtype=np.intp)
+        reach = max_step_m + self._longest_segment_length
+
+        # samples that can't have been reached from the closest track index of the sample before are suspect
+        is_jump = self.separation_along_track(nearest_track_indices[1:], nearest_track_indices[:-1]) > reach
+        suspect_indices = np.flatnonzero(is_jump) + 1
+
+        next_suspect = 0
+        while next_suspect < len(suspect_indices):
+            i = suspect_indices[next_suspect]
+
+            # follow on from the last suspect sample until snapping agrees with the closest track index again
+            while i < len(valid_points):
+                previous_track_index = snapped_track_indices[i - 1]
+                if self.separation_along_track(nearest_track_indices[i], previous_track_index) <= reach:
+                    snapped_track_indices[i] = nearest_track_indices[i]
+                    break
+
+                reachable = self.track_indices_within(previous_track_index, reach)
+                distances = np.linalg.norm(self._points[reachable] - valid_points[i], axis=1)
+
+                if np.min(distances) - nearest_distances[i] > reacquire_distance_m:
+                    snapped_track_indices[i] = nearest_track_indices[i]
+                    break
+
+                snapped_track_indices[i] = reachable[np.argmin(distances)]
+                i += 1
+
+            next_suspect = np.searchsorted(suspect_indices, i, side="right")
+
+        # like np.argmin, a missing position is closest to the first track index
+        track_indices = np.zeros(len(points), dtype=np.intp)
+        track_indices[is_valid] = snapped_track_indices
+
+        cross_track_error = np.full(len(points), np.nan)
+        cross_track_error[is_valid] = self.cross_track_error(valid_points, snapped_track_indices)
+
+        return track_indices, cross_track_error
@@ -6,8 +6,13 @@ from data_tools.schema import File, Result, FileLoader, FileType, Event, Unwrapp
 from data_tools.query.influxdb_query import TimeSeriesTarget
 from data_tools.collections.time_series import TimeSeries
 from pipeline.collect import DataFrameTarget
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from typing import List, Dict, cast
+import numpy as np
+import pandas as pd
 import traceback
+import math
 from prefect import task
 
 
@@ -72,6 +77,11 @@ class IngressStage(Stage):
     def get_stage_name(cls):
         return "ingress"
 
+    @classmethod
+    def is_cacheable(cls) -> bool:
+        # Ingress acquires data from outside of Sunbeam, which may change at any time
+        return False
+
     @staticmethod
     def dependencies():
         return []
@@ -117,11 +127,13 @@ class IngressStage(Stage):
             case DataSourceType.InfluxDB:
                 self._ingress_data_source = InfluxDBDataSource(config)
                 self._ingress_origin = self.context.title
+                self._max_concurrent_queries = config.max_concurrent_queries
+                self._realtime_lateness = config.realtime_lateness
 
                 self._extract_method = self._extract_transform_load_influxdb
 
             case DataSourceType.MongoDB:
-                self._ingress_data_source = MongoDBDataSource()
+                self._ingress_data_source = MongoDBDataSource(config)
 
                 self._ingress_origin = config.ingress_origin
 
@@ -174,25 +186,138 @@ class IngressStage(Stage):
         for event in events:
             result_dict[event.name] = EventDataDict(self._ingress_origin, event.name, self.context.data_source)
 
-            for target in targets:
-                if target.name not in ingress_to_skip:
-                    result_extract = self._fetch_from_influxdb(event, target)
-                    if isinstance(target, TimeSeriesTarget):
-                        result_transform = self._transform_into_timeseries(result_extract, event.name, target.name)
-                    elif isinstance(target, DataFrameTarget):
-                        result_transform = self._wrap_dataframe(result_extract, event.name, target.name)
-                    else:
-                        self.logger.error(f"Unexpected target type {type(target)}")
-                        result_transform = Result.Err(ValueError(f"Unexpected target type {type(target)}"))
-
-                else:
-                    self.logger.error(f"Skipping {target.name}!")
-                    result_transform = None
-
-                result_dict[event.name][target.name] = self._load_file(result_transform, event.name, target.name)
+        # Each query spends most of its time waiting on the network, so we issue them concurrently
+        event_targets = [(event, target) for event in events for target in targets]
+        with ThreadPoolExecutor(max_workers=self._max_concurrent_queries) as executor:
+            file_loaders = executor.map(
+                lambda event_target: self._extract_transform_load_target(*event_target, ingress_to_skip),
+                event_targets
+            )
+
+            for (event, target), file_loader in zip(event_targets, file_loaders):
+                result_dict[event.name][target.name] = file_loader
 
         return (result_dict, )
 
+    def _extract_transform_load_target(
+            self,
+            event: Event,
+            target: TimeSeriesTarget | DataFrameTarget,
+            ingress_to_skip: List[str]
+    ) -> FileLoader:
+        """
+        Extract, marshall and store the raw data of a single target for a single event.
+
+        :param event: the event that the raw data will be acquired for
+        :param target: the target that will be acquired from InfluxDB
+        :param ingress_to_skip: the names of targets that should not be acquired
+        """
+        if target.name not in ingress_to_skip:
+            if event.attributes and event.attributes.get("realtime") and isinstance(target, TimeSeriesTarget):
+                return self._extract_transform_load_incremental(event, target)
+
+            result_extract = self._fetch_from_influxdb(event, target)
+            if isinstance(target, TimeSeriesTarget):
+                result_transform = self._transform_into_timeseries(result_extract, event.name, target.name)
+            elif isinstance(target, DataFrameTarget):
+                result_transform = self._wrap_dataframe(result_extract, event.name, target.name)
+            else:
+                self.logger.error(f"Unexpected target type {type(target)}")
+                result_transform = Result.Err(ValueError(f"Unexpected target type {type(target)}"))
+
+        else:
+            self.logger.error(f"Skipping {target.name}!")
+            result_transform = None
+
+        return self._load_file(result_transform, event.name, target.name)
+
+    def _extract_transform_load_incremental(self, event: Event, target: TimeSeriesTarget) -> FileLoader:
+        """
+        Extract only the raw data of a target that has arrived since the last time it was ingested for a realtime
+        event, and append it to the stored time series.
+
+        The next time window begins at the last sample of the stored time series, less ``realtime_lateness`` seconds
+        such that telemetry which reached InfluxDB after the last time window was queried is still acquired, and
+        raw data which falls short of a whole period of the stored time series is queried again next time.
+
+        :param event: the realtime event that the raw data will be acquired for
+        :param target: the target that will be acquired from InfluxDB
+        """
+        existing_result: Result = self.context.data_source.get(CanonicalPath(
+            origin=self.context.title,
+            source=self.get_stage_name(),
+            event=event.name,
+            name=target.name
+        ))
+
+        stop: datetime = min(event.stop, datetime.now(timezone.utc))
+
+        # If we haven't ingested this target before, we need to acquire all of it
+        if not existing_result:
+            result_extract = self._fetch_from_influxdb(event, target, event.start_as_iso_str, stop.isoformat())
+            result_transform = self._transform_into_timeseries(result_extract, event.name, target.name)
+
+            return self._load_file(result_transform, event.name, target.name)
+
+        existing_file: File = existing_result.unwrap()
+        start: datetime = max(
+            event.start,
+            datetime.fromtimestamp(existing_file.data.stop.timestamp() - self._realtime_lateness, timezone.utc)
+        )
+
+        result_extract = self._fetch_from_influxdb(event, target, start.isoformat(), stop.isoformat()) \
+            if start < stop else None
+
+        appended: TimeSeries = self._append_to_timeseries(existing_file.data, result_extract.unwrap()["data"], target) \
+            if result_extract else existing_file.data
+
+        # If nothing new has arrived, leave everything as it is and try the same time window again next time
+        if appended is existing_file.data:
+            return self.context.data_source.store(File(
+                canonical_path=existing_file.canonical_path,
+                file_type=FileType.TimeSeries,
+                data=None
+            ))
+
+        return self._load_file(Result.Ok(File(
+            canonical_path=existing_file.canonical_path,
+            description=existing_file.description,
+            file_type=FileType.TimeSeries,
+            data=appended
+        )), event.name, target.name)
+
+    @staticmethod
+    def _append_to_timeseries(time_series: TimeSeries, query_df: pd.DataFrame, target: TimeSeriesTarget) -> TimeSeries:
+        """
+        Append the raw data in ``query_df`` which comes after the end of ``time_series`` to it, re-interpolating it
+        onto the continuation of the temporal axis of ``time_series``.
+        """
+        raw_x_axis = pd.to_datetime(query_df["_time"]).map(lambda x: x.timestamp()).to_numpy()
+        raw_wave = query_df[target.field].to_numpy(dtype=float)
+
+        # Ignore anything that we already have, as each time window overlaps the end of the last one
+        last_time: float = time_series.stop.timestamp()
+        is_new = raw_x_axis > last_time
+
+        num_new_elements = math.floor((raw_x_axis[is_new][-1] - last_time) / time_series.period) if is_new.any() else 0
+        if num_new_elements == 0:
+            return time_series
+
+        # Interpolate from the last element that we already have, so that the time series remains continuous
+        new_x_axis = last_time + time_series.period * np.arange(1, num_new_elements + 1)
+        new_wave = np.interp(
+            new_x_axis,
+            np.concatenate([[last_time], raw_x_axis[is_new]]),
+            np.concatenate([[np.asarray(time_series)[-1]], raw_wave[is_new]])
+        )
+
+        appended = time_series.promote(np.concatenate([np.asarray(time_series), new_wave]))
+        appended.meta.update(time_series.meta)
+        appended._stop = datetime.fromtimestamp(new_x_axis[-1], time_series.stop.tzinfo)
+        appended._length = new_x_axis[-1] - time_series.start.timestamp()
+
+        return appended
+
     def _extract_transform_load_existing(
             self,
             targets: List[TimeSeriesTarget],
@@ -233,7 +358,13 @@ class IngressStage(Stage):
 
         return result
 
-    def _fetch_from_influxdb(self, event: Event, target: TimeSeriesTarget) -> Result[dict]:
+    def _fetch_from_influxdb(
+            self,
+            event: Event,
+            target: TimeSeriesTarget,
+            start: str = None,
+            stop: str = None
+    ) -> Result[dict]:
         try:
             offset = event.attributes.get("time_offset")
 
@@ -244,8 +375,8 @@ class IngressStage(Stage):
                     event=target.measurement,
                     name=target.field
                 ),
-                start=event.start_as_iso_str,
-                stop=event.stop_as_iso_str,
+                start=start if start is not None else event.start_as_iso_str,
+                stop=stop if stop is not None else event.stop_as_iso_str,
                 offset=offset
             ).unwrap()
 
@@ -0,0 +1,152 @@
+from numpy.typing import NDArray, ArrayLike
+import numpy as np
+
+
+# Number of samples that are integrated at a time, which bounds the size of any temporary arrays
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+
+def valid_segments(values: ArrayLike) -> NDArray:
+    """
+    Find the runs of valid (finite) samples in ``values``, which are separated by gaps of missing (NaN) samples.
+
+    :param values: the samples to search for gaps
+    :return: array of shape (K, 2) holding the start (inclusive) and stop (exclusive) index of each of the K runs
+    """
+    values = np.asarray(values)
+
+    if len(values) == 0:
+        return np.empty((0, 2), dtype=np.intp)
+
+    # Any missing sample makes the sum NaN, so this is a cheap way to rule out gaps before searching for them
+    if np.isfinite(np.sum(values)):
+        return np.array([[0, len(values)]])
+
+    is_valid = np.isfinite(values)
+
+    # The difference of a boolean array is True wherever a run of valid samples starts or stops
+    edges = np.flatnonzero(np.diff(is_valid, prepend=False, append=False))
+
+    return edges.reshape(-1, 2)
+
+
+def _fill_gaps(values: NDArray, segments: NDArray, previous: float | None) -> tuple[NDArray, NDArray]:
+    """
+    Linearly interpolate each missing sample of ``values`` between the valid samples on either side of its gap.
+    A gap at the start is interpolated from ``previous``, the last valid sample before ``values``, or else holds the
+    first valid sample. A gap at the end holds the last valid sample.
+
+    :param values: the samples to fill the gaps of
+    :param segments: the runs of valid samples in ``values``, as found by ``valid_segments``
+    :param previous: the last valid sample before ``values``, if there is one
+    :return: the indices of the missing samples, and the value that each should be filled with
+    """
+    gap_starts = np.concatenate([[0], segments[:, 1]])
+    gap_stops = np.concatenate([segments[:, 0], [len(values)]])
+    gap_lengths = gap_stops - gap_starts
+
+    is_gap = gap_lengths > 0
+    gap_starts, gap_stops, gap_lengths = gap_starts[is_gap], gap_stops[is_gap], gap_lengths[is_gap]
+
+    if len(gap_lengths) == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0)
+
+    # Sample on either side of each gap, where a missing neighbour is taken from the other side
+    left = np.where(gap_starts > 0, values[np.maximum(gap_starts - 1, 0)], np.nan if previous is None else previous)
+    right = np.where(gap_stops < len(values), values[np.minimum(gap_stops, len(values) - 1)], np.nan)
+    left = np.where(np.isnan(left), right, left)
+    right = np.where(np.isnan(right), left, right)
+
+    # Flat index of every missing sample, along with the gap it belongs to
+    gap_of_sample = np.repeat(np.arange(len(gap_lengths)), gap_lengths)
+    indices = np.arange(np.sum(gap_lengths)) - np.repeat(np.cumsum(gap_lengths) - gap_lengths - gap_starts,
+                                                         gap_lengths)
+
+    fraction = (indices - gap_starts[gap_of_sample] + 1) / (gap_lengths[gap_of_sample] + 1)
+    fill = left[gap_of_sample] + (right[gap_of_sample] - left[gap_of_sample]) * fraction
+
+    return indices, fill
+
+
+class CumulativeIntegrator:
+    """
+    Cumulatively integrate a uniformly sampled series chunk by chunk, carrying the running total from one chunk to
+    the next, such that the integral can be written into a single preallocated (or memory-mapped) array without
+    creating any temporary arrays as long as the series. Integration can be resumed later from the running total.
+
+    Gaps of missing (NaN) samples are bridged by linearly interpolating across them, rather than being treated as
+    zero. Otherwise, the integral is identical to ``np.cumsum(values) * period / divisor``.
+    """
+    def __init__(self, period: float, divisor: float = 1.0, running_total: float = 0.0,
+                 last_valid_sample: float | None = None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        :param float period: the period of the series, in seconds
+        :param float divisor: the integral is divided by this, for example to convert from seconds to hours
+        :param float running_total: the sum of every sample that has already been integrated, to resume from
+        :param float last_valid_sample: the last valid sample that has already been integrated, to resume from
+        :param int chunk_size: the number of samples to integrate at a time
+        """
+        self._period = period
+        self._divisor = divisor
+        self._running_total = running_total
+        self._last_valid_sample = last_valid_sample
+        self._chunk_size = chunk_size
+
+    @property
+    def running_total(self) -> float:
+        """
+        The sum of every sample that has been integrated, from which integration can be resumed.
+        """
+        return self._running_total
+
+    @property
+    def last_valid_sample(self) -> float | None:
+        """
+        The last valid sample that has been integrated, from which a gap at the start of the next samples is
+        interpolated.
+        """
+        return self._last_valid_sample
+
+    def integrate(self, values: ArrayLike, out: NDArray = None, segments: NDArray = None) -> NDArray:
+        """
+        Integrate ``values``, continuing from the samples that have already been integrated.
+
+        :param values: the samples to be integrated
+        :param out: array of the same length as ``values`` to write the integral into, instead of allocating one
+        :param segments: the runs of valid samples in ``values`` if they are already known, see ``valid_segments``
+        :return: the integral up to and including each sample
+        """
+        values = np.asarray(values)
+
+        if out is None:
+            out = np.empty(len(values))
+
+        if segments is None:
+            segments = valid_segments(values)
+
+        gap_indices, gap_fill = _fill_gaps(values, segments, self._last_valid_sample)
+
+        if len(segments) > 0:
+            self._last_valid_sample = float(values[segments[-1, 1] - 1])
+
+        # Accumulating from a separate buffer, rather than in place, avoids a copy that numpy makes when they overlap
+        buffer = np.empty(min(self._chunk_size, len(values)))
+
+        for start in range(0, len(values), self._chunk_size):
+            chunk = out[start:start + self._chunk_size]
+            samples = buffer[:len(chunk)]
+            samples[:] = values[start:start + self._chunk_size]
+
+            if len(gap_indices) > 0:
+                gaps_in_chunk = slice(*np.searchsorted(gap_indices, [start, start + len(chunk)]))
+                samples[gap_indices[gaps_in_chunk] - start] = gap_fill[gaps_in_chunk]
+
+            # Adding the running total to the first sample accumulates in exactly the same order as one cumsum
+            samples[0] += self._running_total
+            np.cumsum(samples, out=chunk)
+            self._running_total = float(chunk[-1])
+
+            chunk *= self._period
+            chunk /= self._divisor
+
+        return out
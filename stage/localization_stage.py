@@ -8,12 +8,20 @@ from data_tools.lap_tools import FSGPDayLaps
 from prefect import task
 from numpy.typing import NDArray
 from physics.environment.gis.gis import GIS
+from stage.integration import CumulativeIntegrator
+from stage.gps_localization import TrackFrame
+from scipy.spatial import cKDTree
 import numpy as np
+import functools
 import copy
 
 
 NCM_LAP_LEN_M = 5033.62413472
 
+# How close, relative to their distance, the two track indices nearest a position must be for them to be treated as
+# possibly tied, which is far coarser than rounding error but far finer than the spacing of track indices
+TRACK_INDEX_TIE_TOLERANCE = 1e-9
+
 
 fsgp_lap_days = {
     "FSGP_2024_Day_1": 1,
@@ -29,7 +37,7 @@ class LocalizationStage(Stage):
 
     @staticmethod
     def dependencies():
-        return ["ingress"]
+        return ["ingress", "cleanup"]
 
     @staticmethod
     @task(name="Localization")
@@ -66,7 +74,15 @@ class LocalizationStage(Stage):
         8. GPSLongitude
             Latitude TimeSeries of the car in degrees, filtered for anomalies.
         9. TrackIndexGPS
-            Track index based on nearest filtered GPS coordinates.
+            Track index based on nearest filtered GPS coordinates. Found by cartesian distance in degrees, or in
+            geodesic mode by distance in meters while being kept continuous along the track, as configured in
+            localization_configuration.toml.
+        10. IntegratedDistance
+            Distance travelled since the start of the event, by integrating SpeedMPS. Shared by every output that is
+            derived from distance, such that SpeedMPS is only integrated once.
+        11. CrossTrackErrorGPS
+            Distance in meters from filtered GPS coordinates to the track near TrackIndexGPS. Only available in
+            geodesic mode.
 
         :param self: an instance of LocalizationStage to be run
         :param FileLoader gps_latitude_df_loader: loader to GPSLatitude dataframe from Ingress
@@ -94,6 +110,13 @@ class LocalizationStage(Stage):
         self._event = event
         self._event_name = event.name
 
+    @property
+    def gps_localization_config(self) -> dict:
+        """
+        How TrackIndexGPS is found from GPS coordinates, see localization_configuration.toml.
+        """
+        return self.stage_data["localization_configuration"]["gps_localization"]
+
     def extract(self,
                 gps_latitude_df_loader: FileLoader,
                 gps_longitude_df_loader: FileLoader,
@@ -120,6 +143,8 @@ class LocalizationStage(Stage):
             lap_index_spreadsheet_result = Result.Err(RuntimeError("Failed to process LapIndexSpreadsheet!"))
             track_distance_spreadsheet_result = Result.Err(RuntimeError("Failed to process TrackDistanceSpreadsheet!"))
             track_index_spreadsheet_result = Result.Err(RuntimeError("Failed to process TrackIndexSpreadsheet!"))
+            integrated_distance_result = Result.Err(RuntimeError("Failed to process IntegratedDistance!"))
+            cross_track_error_gps_result = Result.Err(RuntimeError("Failed to process CrossTrackErrorGPS!"))
             lap_index_result = lap_index_integrated_speed_result
             track_index_result = track_index_spreadsheet_result
 
@@ -132,7 +157,9 @@ class LocalizationStage(Stage):
                 track_index_spreadsheet_result,
                 gps_latitude_result,
                 gps_longitude_result,
-                track_index_gps_result
+                track_index_gps_result,
+                integrated_distance_result,
+                cross_track_error_gps_result
             )
 
         coords = coords_result.unwrap()
@@ -143,6 +170,7 @@ class LocalizationStage(Stage):
             gps_latitude_result = Result.Err(RuntimeError("Failed to process GPSLatitude!"))
             gps_longitude_result = Result.Err(RuntimeError("Failed to process GPSLongitude!"))
             track_index_gps_result = Result.Err(RuntimeError("Failed to process TrackIndexGPS!"))
+            cross_track_error_gps_result = Result.Err(RuntimeError("Failed to process CrossTrackErrorGPS!"))
 
         else:
             # !!!! FIX THE INVERTED VALUES !!!! - FIXME
@@ -179,21 +207,37 @@ class LocalizationStage(Stage):
             gps_latitude_result = Result.Ok(gps_latitude_ts)
             gps_longitude_result = Result.Ok(gps_longitude_ts)
 
-            track_index_gps_ts = self._get_gps_track_index(gps_latitude_ts, gps_longitude_ts, coords)
-            track_index_gps_result = Result.Ok(track_index_gps_ts)
+            if self.gps_localization_config["mode"] == "geodesic":
+                track_index_gps_ts, cross_track_error_gps_ts = self._get_gps_track_index_geodesic(
+                    gps_latitude_ts,
+                    gps_longitude_ts,
+                    coords,
+                    self.gps_localization_config["max_step_m"],
+                    self.gps_localization_config["reacquire_distance_m"]
+                )
+                cross_track_error_gps_result = Result.Ok(cross_track_error_gps_ts)
 
+            else:
+                track_index_gps_ts = self._get_gps_track_index(gps_latitude_ts, gps_longitude_ts, coords)
+                cross_track_error_gps_result = Result.Err(
+                    RuntimeError("CrossTrackErrorGPS is only available in geodesic mode!"))
+
+            track_index_gps_result = Result.Ok(track_index_gps_ts)
 
         # lap index integrated speed, lap/track index from spreadsheet
         try:
             speed_mps_ts: TimeSeries = speed_mps_result.unwrap().data
 
-            lap_index_integrated_speed_result = self._get_lap_index_integrated_speed(speed_mps_ts)
+            integrated_distance_ts = self._get_integrated_distance(speed_mps_ts)
+            integrated_distance_result = Result.Ok(integrated_distance_ts)
+
+            lap_index_integrated_speed_result = self._get_lap_index_integrated_speed(integrated_distance_ts)
 
             lap_index_spreadsheet_ts = self._get_lap_index_spreadsheet(self.event, speed_mps_ts)
             lap_index_spreadsheet_result = Result.Ok(lap_index_spreadsheet_ts)
 
             track_distance_spreadsheet_ts, track_index_spreadsheet_ts = self._get_track_index_spreadsheet(
-                self.event, lap_index_spreadsheet_ts, speed_mps_ts, coords
+                self.event, lap_index_spreadsheet_ts, speed_mps_ts, integrated_distance_ts, coords
             )
             track_distance_spreadsheet_result = Result.Ok(track_distance_spreadsheet_ts)
             track_index_spreadsheet_result = Result.Ok(track_index_spreadsheet_ts)
@@ -203,6 +247,7 @@ class LocalizationStage(Stage):
             lap_index_spreadsheet_result = Result.Err(RuntimeError("Failed to process LapIndexSpreadsheet!"))
             track_distance_spreadsheet_result = Result.Err(RuntimeError("Failed to process TrackDistanceSpreadsheet!"))
             track_index_spreadsheet_result = Result.Err(RuntimeError("Failed to process TrackIndexSpreadsheet!"))
+            integrated_distance_result = Result.Err(RuntimeError("Failed to process IntegratedDistance!"))
 
         # determine the best lap and track index available
         if lap_index_spreadsheet_result:
@@ -223,7 +268,9 @@ class LocalizationStage(Stage):
                 track_index_spreadsheet_result,
                 gps_latitude_result,
                 gps_longitude_result,
-                track_index_gps_result)
+                track_index_gps_result,
+                integrated_distance_result,
+                cross_track_error_gps_result)
 
     def load(self,
              lap_index_result,
@@ -234,7 +281,9 @@ class LocalizationStage(Stage):
              track_index_spreadsheet_result,
              gps_latitude_result,
              gps_longitude_result,
-             track_index_gps_result) -> tuple[FileLoader, ...]:
+             track_index_gps_result,
+             integrated_distance_result,
+             cross_track_error_gps_result) -> tuple[FileLoader, ...]:
 
         file_details = {
             "LapIndex": {
@@ -280,6 +329,16 @@ class LocalizationStage(Stage):
             "TrackIndexGPS": {
                 "data": track_index_gps_result.unwrap() if track_index_gps_result else None,
                 "description": "Track index based on nearest filtered GPS coordinates."
+            },
+            "IntegratedDistance": {
+                "data": integrated_distance_result.unwrap() if integrated_distance_result else None,
+                "description": "Distance travelled since the start of the event in meters, by integrating SpeedMPS. "
+                               "Gaps in SpeedMPS are interpolated across."
+            },
+            "CrossTrackErrorGPS": {
+                "data": cross_track_error_gps_result.unwrap() if cross_track_error_gps_result else None,
+                "description": "Distance in meters from filtered GPS coordinates to the track near TrackIndexGPS, in a "
+                               "local east-north-up frame at the track. Only available in geodesic mode."
             }
         }
 
@@ -312,15 +371,7 @@ class LocalizationStage(Stage):
         """
         # abs_coords has dimension (n_track_indices, 2), where the second dimension is lat/lon
         # lat and lon have dimension (t)
-
-        # Broadcast subtract to create a matrix with dimension (t, n_track_indices)
-        lat_diffs = coords[:, 0][None, :] - lat[:, None]
-        lon_diffs = coords[:, 1][None, :] - lon[:, None]
-
-        # Create a matrix with dimension (t, n_track_indices) with cartesian distance values,
-        # then take the minimum index along axis 1 to get the closest index.
-        squared_distances = lat_diffs ** 2 + lon_diffs ** 2  # (t, n_track_indices)
-        track_indices = np.argmin(squared_distances, axis=1)
+        track_indices = nearest_track_indices(coords, np.asarray(lat), np.asarray(lon))
 
         # convert to TimeSeries
         track_index_gps = lat.promote(track_indices)
@@ -329,55 +380,97 @@ class LocalizationStage(Stage):
 
         return track_index_gps
 
+    @staticmethod
+    def _get_gps_track_index_geodesic(lat: TimeSeries, lon: TimeSeries, coords: NDArray, max_step_m: float,
+                                      reacquire_distance_m: float) -> tuple[TimeSeries, TimeSeries]:
+        """Determine the Track Indices of GPS coordinates by distance in meters, in a local east-north-up frame at the
+        track, while keeping them continuous along the track (see ``TrackFrame.localize``).
+        Note: Telemetry GPS data removes the sign for lat/lon, as do the track coordinates. Both are projected the same
+              way, so distances are unaffected.
+        """
+        track_indices, cross_track_error = _get_track_frame(_coordinates_key(coords)).localize(
+            np.asarray(lat), np.asarray(lon), max_step_m, reacquire_distance_m
+        )
+
+        track_index_gps = lat.promote(track_indices)
+        track_index_gps.name = "TrackIndexGPS"
+        track_index_gps.units = "Track Index"
+
+        cross_track_error_gps = lat.promote(cross_track_error)
+        cross_track_error_gps.name = "CrossTrackErrorGPS"
+        cross_track_error_gps.units = "m"
+
+        return track_index_gps, cross_track_error_gps
 
     @staticmethod
-    def _get_lap_index_integrated_speed(speed_mps_ts: TimeSeries) -> Result[TimeSeries]:
-        integrated_speed_m = np.cumsum(speed_mps_ts) * speed_mps_ts.period
-        lap_index_integrated_speed = speed_mps_ts.promote(
-            np.array([int(dist_m // NCM_LAP_LEN_M) for dist_m in integrated_speed_m]))
+    def _get_integrated_distance(speed_mps_ts: TimeSeries) -> TimeSeries:
+        integrated_distance = CumulativeIntegrator(speed_mps_ts.period).integrate(np.asarray(speed_mps_ts))
+        integrated_distance_ts = speed_mps_ts.promote(integrated_distance)
+        integrated_distance_ts.name = "IntegratedDistance"
+        integrated_distance_ts.units = "m"
+        return integrated_distance_ts
+
+    @staticmethod
+    def _get_lap_index_integrated_speed(integrated_distance_ts: TimeSeries) -> Result[TimeSeries]:
+        lap_index_integrated_speed = integrated_distance_ts.promote(
+            np.floor_divide(np.asarray(integrated_distance_ts), NCM_LAP_LEN_M).astype(int))
         lap_index_integrated_speed.name = "LapIndexIntegratedSpeed"
         lap_index_integrated_speed.units = "Laps"
         return Result.Ok(lap_index_integrated_speed)
 
     @staticmethod
-    def _get_track_index_spreadsheet(event: Event, lap_index_spreadsheet: TimeSeries, speed_mps_ts: TimeSeries, coords: NDArray):
+    def _get_track_index_spreadsheet(
+            event: Event,
+            lap_index_spreadsheet: TimeSeries,
+            speed_mps_ts: TimeSeries,
+            integrated_distance_ts: TimeSeries,
+            coords: NDArray
+    ):
         if event.name not in fsgp_lap_days.keys():
             return None, None  # result is not defined
 
-        route_data = {
-            "path": coords,
-            "elevations": np.zeros(len(coords)),
-            "time_zones": np.zeros(len(coords)),
-            "num_unique_coords": (len(coords) - 1)}
-
-        # Create a GIS object
-        starting_coords = [37.00107373, -86.36854755] # TODO: Unhard-code this??
-        gis = GIS(route_data, starting_coords, current_coord=starting_coords)
-
         # get indices in time for when a new lap begins
         # set nans to -1 so that we have an increase when we begin lap 0
         lap_starts = np.nonzero(np.diff(np.nan_to_num(lap_index_spreadsheet, nan=-1)))[0] + np.array(1)
-        speed_split = np.split(speed_mps_ts, lap_starts)
-        speed_by_lap = speed_split[1:-1] # discard times outside of when we are doing laps
-
-        track_distance: list[NDArray] = []
-        track_indices: list[NDArray] = []
-        for lap_speed_array in speed_by_lap:
-            lap_total_distance_m = np.sum(lap_speed_array) * speed_mps_ts.period
-            track_distance.append(np.cumsum(lap_speed_array) * speed_mps_ts.period)
-            norm_factor = NCM_LAP_LEN_M / lap_total_distance_m  # normalize such that all laps appear to travel the same distance
-            lap_distance_per_tick = lap_speed_array * norm_factor * speed_mps_ts.period
-            track_indices.append(gis.calculate_closest_gis_indices(lap_distance_per_tick))
-
-        track_distance_flat = np.concatenate(
-            [np.full_like(speed_split[0], np.nan)] + track_distance + [np.full_like(speed_split[-1], np.nan)]
-        )
+
+        # discard times outside of when we are doing laps, which are before the first lap starts and after the
+        # last lap start (which is really where the final lap ends)
+        first_lap_start = lap_starts[0] if len(lap_starts) > 0 else len(speed_mps_ts)
+        last_lap_start = lap_starts[-1] if len(lap_starts) > 0 else len(speed_mps_ts)
+
+        # distance travelled within each lap is the integrated distance since the end of the previous lap
+        integrated_distance = np.asarray(integrated_distance_ts)
+        lap_start_distances = np.where(lap_starts[:-1] > 0, integrated_distance[np.maximum(lap_starts[:-1] - 1, 0)], 0)
+        lap_total_distances = integrated_distance[lap_starts[1:] - 1] - lap_start_distances
+
+        track_distance_flat = np.full(len(speed_mps_ts), np.nan)
+        track_distance_flat[first_lap_start:last_lap_start] = (integrated_distance[first_lap_start:last_lap_start]
+                                                               - np.repeat(lap_start_distances, np.diff(lap_starts)))
         track_distance_ts = speed_mps_ts.promote(track_distance_flat)
         track_distance_ts.name = "TrackDistanceSpreadsheet"
         track_distance_ts.units = "m"
 
+        # normalize such that all laps appear to travel the same distance, then map every lap onto the track at once
+        norm_factors = NCM_LAP_LEN_M / lap_total_distances
+        normalized_track_distance = (track_distance_flat[first_lap_start:last_lap_start]
+                                     * np.repeat(norm_factors, np.diff(lap_starts)))
+
+        # like GIS.calculate_closest_gis_indices, the track index only ever advances within a lap, even where speed
+        # dips negative, which makes the track index a function of the furthest distance travelled so far in the lap.
+        # Each lap is offset above every lap before it, such that a single running maximum restarts at each lap, and
+        # the furthest distance is read back from the sample where it was reached, so that offsetting doesn't round it
+        lap_numbers = np.repeat(np.arange(len(lap_starts) - 1), np.diff(lap_starts))
+        lap_offset = np.ptp(normalized_track_distance) + 1 if len(normalized_track_distance) > 0 else 0.0
+        offset_track_distance = normalized_track_distance + lap_numbers * lap_offset
+
+        is_furthest = offset_track_distance == np.maximum.accumulate(offset_track_distance)
+        furthest_samples = np.maximum.accumulate(np.where(is_furthest, np.arange(len(is_furthest)), 0))
+        normalized_track_distance = normalized_track_distance[furthest_samples]
+
+        track_indices = closest_track_indices(get_cumulative_track_distances(coords), normalized_track_distance)
+
         track_index_flat = np.concatenate(
-            [np.zeros_like(speed_split[0])] + track_indices + [np.full_like(speed_split[-1], np.nan)]
+            [np.zeros(first_lap_start), track_indices, np.full(len(speed_mps_ts) - last_lap_start, np.nan)]
         )
         track_index_ts = speed_mps_ts.promote(track_index_flat)
         track_index_ts.name = "TrackIndexSpreadsheet"
@@ -394,18 +487,11 @@ class LocalizationStage(Stage):
         timezone_fix = 60 * 60 * 7
         unix_times: NDArray[float] = speed_mps_ts.unix_x_axis + timezone_fix
 
-        lap_info = FSGPDayLaps(fsgp_lap_days[event.name])
-        num_laps = lap_info.get_lap_count()
-        race_start_unix = lap_info.get_start_utc(1).timestamp()
-        lap_finishes_unix: list[float] = [
-            lap_info.get_finish_utc(lap_idx + 1).timestamp() for lap_idx in range(num_laps)
-        ]
-        lap_indices: NDArray = np.zeros(unix_times.shape)
-        for i, time in enumerate(unix_times):
-            if (time < race_start_unix) or (time > lap_finishes_unix[-1]):
-                lap_indices[i] = np.nan
-            else:
-                lap_indices[i] = np.count_nonzero(time > np.array(lap_finishes_unix))
+        race_start_unix, lap_finishes_unix = _get_fsgp_lap_times(fsgp_lap_days[event.name])
+
+        # the lap index is the number of laps finished strictly before each time
+        lap_indices: NDArray = np.searchsorted(np.sort(lap_finishes_unix), unix_times, side="left").astype(float)
+        lap_indices[(unix_times < race_start_unix) | (unix_times > lap_finishes_unix[-1])] = np.nan
 
         lap_indices_ts = speed_mps_ts.promote(lap_indices)
         lap_indices_ts.name = "LapIndexSpreadsheet"
@@ -416,4 +502,149 @@ class LocalizationStage(Stage):
         pass
 
 
+@functools.lru_cache(maxsize=None)
+def _get_fsgp_lap_times(day: int) -> tuple[float, NDArray]:
+    """
+    Parse the FSGP timing spreadsheet for ``day`` (via FSGPDayLaps) into the race start time and the finish time of
+    each lap, as UNIX timestamps. Cached, such that each spreadsheet is only parsed once.
+
+    :return: the race start time, and the finish time of each lap in order of lap number
+    """
+    lap_info = FSGPDayLaps(day)
+    num_laps = lap_info.get_lap_count()
+    race_start_unix = lap_info.get_start_utc(1).timestamp()
+    lap_finishes_unix = np.array([lap_info.get_finish_utc(lap_idx + 1).timestamp() for lap_idx in range(num_laps)])
+    lap_finishes_unix.flags.writeable = False  # shared between every caller
+
+    return race_start_unix, lap_finishes_unix
+
+
+def _coordinates_key(coords: NDArray) -> tuple[tuple[float, float], ...]:
+    """
+    Convert track coordinates into a hashable key, by which anything derived from them can be cached.
+    """
+    return tuple(map(tuple, coords.tolist()))
+
+
+@functools.lru_cache(maxsize=8)
+def _get_track_gis(coordinates: tuple[tuple[float, float], ...]) -> GIS:
+    """
+    Build the GIS route of a track from the lat/lon coordinates of each track index, which is cached such that it is
+    only built once for each set of track coordinates.
+    """
+    coords = np.array(coordinates)
+    route_data = {
+        "path": coords,
+        "elevations": np.zeros(len(coords)),
+        "time_zones": np.zeros(len(coords)),
+        "num_unique_coords": (len(coords) - 1)}
+
+    starting_coords = [37.00107373, -86.36854755]  # TODO: Unhard-code this??
+    return GIS(route_data, starting_coords, current_coord=starting_coords)
+
+
+@functools.lru_cache(maxsize=8)
+def _get_cumulative_track_distances(coordinates: tuple[tuple[float, float], ...]) -> NDArray:
+    cumulative_track_distances = np.cumsum(_get_track_gis(coordinates).get_path_distances())
+    cumulative_track_distances.flags.writeable = False  # shared between every caller
+
+    return cumulative_track_distances
+
+
+def get_cumulative_track_distances(coords: NDArray) -> NDArray:
+    """
+    Get the distance along the track from its start to the end of each track index, for the track given by the
+    lat/lon coordinates of each track index. Cached, such that it is only computed once for each track.
+
+    :param coords: lat/lon coordinates of each track index, of dimension (n_track_indices, 2)
+    :return: cumulative distance along the track, in meters
+    """
+    return _get_cumulative_track_distances(_coordinates_key(coords))
+
+
+def closest_track_indices(cumulative_track_distances: NDArray, distances: NDArray) -> NDArray:
+    """
+    Map distances travelled along a track to the track index that each one falls within, which is a batched
+    equivalent of ``GIS.calculate_closest_gis_indices`` that takes the cumulative distance travelled along the track
+    instead of the distance travelled at each tick. Distances beyond the end of the track wrap around to its start.
+
+    Since each distance is looked up independently, any number of laps can be mapped together in a single pass, but
+    the track index also moves backwards wherever the distance does. To match ``GIS.calculate_closest_gis_indices``,
+    which only ever advances, pass the running maximum of the distance travelled within each lap.
+
+    :param cumulative_track_distances: distance along the track to the end of each track index,
+        see ``get_cumulative_track_distances``
+    :param distances: distance travelled along the track since the start of the track
+    :return: the track index of each distance
+    """
+    track_length = cumulative_track_distances[-1]
+    num_wraps = np.maximum(np.ceil(distances / track_length) - 1, 0)
+    wrapped_distances = distances - num_wraps * track_length
+
+    track_indices = np.searchsorted(cumulative_track_distances, wrapped_distances, side="left")
+    return np.minimum(track_indices, len(cumulative_track_distances) - 1)
+
+
+@functools.lru_cache(maxsize=8)
+def _track_index_tree(coordinates: tuple[tuple[float, float], ...]) -> tuple[cKDTree, NDArray]:
+    """
+    Build a spatial index over the distinct lat/lon coordinates of the track indices, along with the lowest track
+    index at each of them, which is cached such that it is only built once for each set of track coordinates.
+    """
+    distinct_coordinates, lowest_track_indices = np.unique(np.array(coordinates), axis=0, return_index=True)
+
+    return cKDTree(distinct_coordinates), lowest_track_indices
+
+
+@functools.lru_cache(maxsize=8)
+def _get_track_frame(coordinates: tuple[tuple[float, float], ...]) -> TrackFrame:
+    """
+    Project a track into its local east-north-up frame and build a spatial index over it, which is cached such that
+    it is only done once for each set of track coordinates.
+    """
+    return TrackFrame(np.array(coordinates))
+
+
+def nearest_track_indices(coords: NDArray, lat: NDArray, lon: NDArray) -> NDArray:
+    """
+    Find the track index closest to each lat/lon pair by cartesian distance in degrees, which is identical to taking
+    the argmin of the distance to every track index, but takes O(t log n) time and O(t) memory rather than
+    materializing a (t, n_track_indices) matrix of distances.
+
+    :param coords: lat/lon coordinates of each track index, of dimension (n_track_indices, 2)
+    :param lat: latitudes to localize, of dimension (t)
+    :param lon: longitudes to localize, of dimension (t)
+    :return: the closest track index to each lat/lon pair, of dimension (t)
+    """
+    tree, lowest_track_indices = _track_index_tree(_coordinates_key(coords))
+
+    points = np.column_stack([lat, lon])
+    is_valid = np.all(np.isfinite(points), axis=1)
+
+    # like np.argmin, a missing position is closest to the first track index
+    track_indices = np.zeros(len(points), dtype=np.intp)
+
+    # track indices at the same coordinates share one point in the tree, which stands for the lowest of them
+    valid_points = points[is_valid]
+    num_neighbours = min(2, tree.n)
+    distances, neighbours = tree.query(valid_points, k=num_neighbours)
+    if num_neighbours == 1:
+        track_indices[is_valid] = lowest_track_indices[neighbours]
+        return track_indices
+
+    valid_track_indices = lowest_track_indices[neighbours[:, 0]]
+
+    # where the two nearest points are equidistant, to within rounding, any number of others may be too, and the tree
+    # may round them differently from np.argmin, so those few are compared against every track index like np.argmin
+    is_tie = distances[:, 1] - distances[:, 0] <= TRACK_INDEX_TIE_TOLERANCE * distances[:, 1]
+    if np.any(is_tie):
+        tied_points = valid_points[is_tie]
+        squared_distances = (tied_points[:, :1] - coords[:, 0]) ** 2 + (tied_points[:, 1:] - coords[:, 1]) ** 2
+        valid_track_indices[is_tie] = np.argmin(squared_distances, axis=1)
+
+    track_indices[is_valid] = valid_track_indices
+
+    return track_indices
+
+
 stage_registry.register_stage(LocalizationStage.get_stage_name(), LocalizationStage)
@@ -1,6 +1,7 @@
 from data_tools.schema import FileLoader
 from stage.stage import Stage
 from stage.stage_registry import stage_registry
+from stage.alignment import align
 from data_tools.schema import Result, UnwrappedError, File, FileType, CanonicalPath, Event
 from data_tools.collections import TimeSeries
 from prefect import task
@@ -91,7 +92,8 @@ class PowerStage(Stage):
             # resulting in a number that represents the sign/direction of the current
             motor_current_sign = motor_current_direction * -2 + 1
 
-            motor_current, motor_voltage, motor_current_sign = TimeSeries.align(
+            motor_current, motor_voltage, motor_current_sign = align(
+                self.event_name,
                 motor_current, motor_voltage, motor_current_sign
             )
             motor_power = motor_current.promote(motor_current * motor_voltage * motor_current_sign)
@@ -108,7 +110,7 @@ class PowerStage(Stage):
             total_pack_voltage: TimeSeries = total_pack_voltage_result.unwrap().data
             pack_current: TimeSeries = pack_current_result.unwrap().data
 
-            total_pack_voltage, pack_current = TimeSeries.align(total_pack_voltage, pack_current)
+            total_pack_voltage, pack_current = align(self.event_name, total_pack_voltage, pack_current)
             pack_power = total_pack_voltage.promote(total_pack_voltage * pack_current)
             pack_power.units = "W"
             pack_power.name = "Pack Power"
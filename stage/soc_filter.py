@@ -0,0 +1,402 @@
+from physics.models.battery import KalmanFilterConfig, EquivalentCircuitBatteryModel
+from numpy.typing import NDArray, ArrayLike
+from typing import Sequence
+import numpy as np
+import math
+
+
+# Step size of the central differences used to linearize the measurement function, as used by FilteredBatteryModel
+_JACOBIAN_STEP = 1e-6
+
+# Below this many filters, stepping each filter on its own is faster than stepping the batch as arrays
+MIN_VECTORIZED_BATCH_SIZE = 24
+
+
+def _horner(coefficients: tuple, x):
+    y = coefficients[0]
+
+    for coefficient in coefficients[1:]:
+        y = y * x + coefficient
+
+    return y
+
+
+def _clip_scalar(x: float, low: float, high: float) -> float:
+    return low if x < low else (high if x > high else x)
+
+
+def _minimum_scalar(x: float, y: float) -> float:
+    return x if x < y else y
+
+
+def _polynomials(kalman_filter_config: KalmanFilterConfig) -> list[NDArray]:
+    battery_model_config = kalman_filter_config.battery_model_config
+
+    return [np.asarray(coefficients, dtype=float) for coefficients in (
+        battery_model_config._U_oc_coefficients,
+        battery_model_config._R_0_coefficients,
+        battery_model_config._R_P_coefficients,
+        battery_model_config._C_P_coefficients,
+    )]
+
+
+def _flatten_parameters(kalman_filter_config: KalmanFilterConfig, num_coefficients: int) -> list[float]:
+    # Leading zero coefficients don't change a polynomial, so every polynomial is padded to the same degree
+    coefficients = [np.pad(polynomial, (num_coefficients - len(polynomial), 0))
+                    for polynomial in _polynomials(kalman_filter_config)]
+
+    return [
+        float(kalman_filter_config.battery_model_config.Q_total),
+        float(np.asarray(kalman_filter_config.measurement_noise_vector).ravel()[0]),
+        *np.asarray(kalman_filter_config.process_noise_matrix, dtype=float).ravel().tolist(),
+        *np.concatenate(coefficients).tolist(),
+    ]
+
+
+class BatchedFilteredBatteryModel:
+    """
+    An Extended Kalman Filter estimating the SOC of a battery modelled as a first-order Thevenin equivalent circuit,
+    producing the same estimates as ``FilteredBatteryModel`` from ``physics``.
+
+    Rather than stepping a general-purpose filter one sample at a time, the 2x2 filter algebra is written out
+    explicitly, and the state and covariance of a batch of independent filters are held in preallocated arrays
+    such that several filters (for example, one per event) can be stepped side-by-side.
+    """
+    def __init__(
+            self,
+            kalman_filter_config: KalmanFilterConfig | Sequence[KalmanFilterConfig],
+            initial_soc: ArrayLike,
+            initial_Uc: ArrayLike = 0.0,
+            alpha: float = 0.9
+    ):
+        """
+        :param kalman_filter_config: Kalman filter configuration, along with the configuration of the underlying
+            equivalent circuit model, either shared by every filter in the batch or given for each filter.
+        :param initial_soc: initial SOC of each filter in the batch, in the range [0, 1.1]. A scalar creates a batch of
+            one filter.
+        :param initial_Uc: initial polarization voltage of each filter in the batch, in Volts.
+        :param float alpha: smoothing factor of the low-pass filter applied to current.
+        """
+        initial_soc = np.atleast_1d(np.asarray(initial_soc, dtype=float))
+        assert np.all((0.0 <= initial_soc) & (initial_soc <= 1.1)), "`initial_soc` must be in [0, 1.1]!"
+        assert 0 <= alpha <= 1, "`alpha` should be between 0 and 1!"
+
+        batch_size = len(initial_soc)
+
+        if isinstance(kalman_filter_config, KalmanFilterConfig):
+            kalman_filter_config = [kalman_filter_config] * batch_size
+
+        if len(kalman_filter_config) != batch_size:
+            raise ValueError(f"Expected {batch_size} Kalman filter configurations, got {len(kalman_filter_config)}!")
+
+        self._alpha = float(alpha)
+
+        # The parameters of each filter, one row per filter
+        num_coefficients = max(len(polynomial) for config in kalman_filter_config for polynomial in _polynomials(config))
+        self._parameters = np.array([_flatten_parameters(config, num_coefficients) for config in kalman_filter_config])
+
+        # The filter state `x`, which is left unclipped between steps, and the clipped SOC that is reported
+        self._x = np.empty((batch_size, 2))
+        self._x[:, 0] = initial_soc
+        self._x[:, 1] = initial_Uc
+        self._SOC = initial_soc.copy()
+
+        self._P = np.array([np.asarray(config.state_covariance_matrix, dtype=float)
+                            for config in kalman_filter_config]).reshape(batch_size, 2, 2)
+
+        self._filtered_I = np.zeros(batch_size)
+
+    @classmethod
+    def from_state(cls, kalman_filter_config: KalmanFilterConfig, state: dict) -> "BatchedFilteredBatteryModel":
+        """
+        Resume a batch of filters from a state captured by ``get_state``.
+
+        :param KalmanFilterConfig kalman_filter_config: the configuration that the filters were created with.
+        :param dict state: the captured state of the filters.
+        """
+        filtered_battery_model = cls(kalman_filter_config, np.clip(state["SOC"], 0.0, 1.1), alpha=state["alpha"])
+
+        filtered_battery_model._x[:] = state["x"]
+        filtered_battery_model._SOC[:] = state["SOC"]
+        filtered_battery_model._P[:] = state["P"]
+        filtered_battery_model._filtered_I[:] = state["filtered_I"]
+
+        return filtered_battery_model
+
+    def get_state(self) -> dict:
+        """
+        Capture the state of every filter in the batch, from which filtering can be resumed with ``from_state``.
+
+        :return: the state of the filters as a dictionary of plain Python values
+        """
+        return {
+            "x": self._x.tolist(),
+            "SOC": self._SOC.tolist(),
+            "P": self._P.tolist(),
+            "filtered_I": self._filtered_I.tolist(),
+            "alpha": self._alpha,
+        }
+
+    @property
+    def batch_size(self) -> int:
+        return len(self._SOC)
+
+    @property
+    def SOC(self) -> NDArray:
+        """
+        The current SOC of each filter in the batch.
+        """
+        return self._SOC.copy()
+
+    @property
+    def Uc(self) -> NDArray:
+        """
+        The current polarization voltage of each filter in the batch, in Volts.
+        """
+        return self._x[:, 1].copy()
+
+    def predict_then_update(self, measured_Ut: ArrayLike, current: ArrayLike, time_step: ArrayLike) -> NDArray:
+        """
+        Step every filter in the batch by one sample.
+
+        :param measured_Ut: terminal voltage measured for each filter in the batch.
+        :param current: current being sourced by the battery for each filter in the batch. Positive indicates
+            current being drawn.
+        :param time_step: time elapsed since the last step, in seconds.
+        :return: the SOC of each filter in the batch after this step
+        """
+        return self.filter(np.atleast_1d(measured_Ut)[np.newaxis], np.atleast_1d(current)[np.newaxis], time_step)[0]
+
+    def filter(
+            self,
+            measured_Ut: ArrayLike,
+            current: ArrayLike,
+            time_step: ArrayLike,
+            out: NDArray = None,
+            mask: ArrayLike = None
+    ) -> NDArray:
+        """
+        Step every filter in the batch through a series of samples, continuing from the current state.
+
+        Filters whose series are of different lengths can be stepped together by padding their series to the same
+        length, and masking out the padding.
+
+        :param measured_Ut: terminal voltage measurements, of shape ``(N,)`` for a batch of one filter or
+            ``(N, batch_size)``.
+        :param current: current measurements, of the same shape as ``measured_Ut``.
+        :param time_step: time elapsed between samples, in seconds, either shared by or given for each filter.
+        :param out: array of the same shape as ``measured_Ut`` to write SOC estimates into, instead of allocating one.
+        :param mask: boolean array of the same shape as ``measured_Ut``, which is ``False`` for samples that should be
+            skipped, as if they didn't exist. Skipped samples have no SOC estimate, and are NaN in the output.
+        :return: the SOC estimated by each filter after each sample, of the same shape as ``measured_Ut``
+        """
+        measured_Ut = np.asarray(measured_Ut, dtype=float)
+        current = np.asarray(current, dtype=float)
+
+        if measured_Ut.shape != current.shape:
+            raise ValueError(f"Voltage of shape {measured_Ut.shape} does not match current of shape {current.shape}!")
+
+        if mask is not None and np.shape(mask) != measured_Ut.shape:
+            raise ValueError(f"Mask of shape {np.shape(mask)} does not match voltage of shape {measured_Ut.shape}!")
+
+        if out is None:
+            out = np.empty(measured_Ut.shape)
+
+        # A series of shape (N,) is the series of a batch of one filter
+        voltage_2d = measured_Ut if measured_Ut.ndim == 2 else measured_Ut[:, np.newaxis]
+        current_2d = current if current.ndim == 2 else current[:, np.newaxis]
+        out_2d = out if out.ndim == 2 else out[:, np.newaxis]
+
+        if voltage_2d.shape[1] != self.batch_size:
+            raise ValueError(f"Expected measurements for {self.batch_size} filters, got {voltage_2d.shape[1]}!")
+
+        if mask is not None:
+            mask_2d = np.asarray(mask, dtype=bool).reshape(voltage_2d.shape)
+            out_2d[~mask_2d] = np.nan
+
+        if len(voltage_2d) == 0:
+            return out
+
+        time_step = np.broadcast_to(np.asarray(time_step, dtype=float), (self.batch_size,))
+
+        # Stepping Python floats is far cheaper than stepping small arrays, so filters are only stepped together
+        # once there are enough of them to amortize the overhead of NumPy
+        if self.batch_size < MIN_VECTORIZED_BATCH_SIZE:
+            for j in range(self.batch_size):
+                state = tuple(float(component[j]) for component in self._get_state())
+                parameters = self._unflatten_parameters(self._parameters[j].tolist())
+                dt = float(time_step[j])
+
+                samples = np.arange(len(voltage_2d)) if mask is None else np.flatnonzero(mask_2d[:, j])
+
+                for i, voltage, current_ in zip(samples.tolist(), voltage_2d[samples, j].tolist(),
+                                                current_2d[samples, j].tolist()):
+                    state = self._step(state, parameters, voltage, current_, dt, math.exp, _minimum_scalar,
+                                       _clip_scalar)
+                    out_2d[i, j] = state[2]
+
+                self._set_state(state, j)
+
+        else:
+            state = self._get_state()
+            parameters = self._unflatten_parameters(list(self._parameters.T))
+
+            # Once no filter has any samples left, there is nothing left to step
+            num_samples = len(voltage_2d) if mask is None else np.flatnonzero(mask_2d.any(axis=1)).max(initial=-1) + 1
+
+            for i in range(num_samples):
+                stepped = self._step(state, parameters, voltage_2d[i], current_2d[i], time_step, np.exp, np.minimum,
+                                     np.clip)
+
+                if mask is None or mask_2d[i].all():
+                    state = stepped
+
+                else:
+                    state = tuple(np.where(mask_2d[i], new, old) for new, old in zip(stepped, state))
+
+                out_2d[i] = np.where(mask_2d[i], state[2], np.nan) if mask is not None else state[2]
+
+            self._set_state(state, slice(None))
+
+        return out
+
+    def _get_state(self) -> tuple:
+        return (self._x[:, 0], self._x[:, 1], self._SOC, self._filtered_I,
+                self._P[:, 0, 0], self._P[:, 0, 1], self._P[:, 1, 0], self._P[:, 1, 1])
+
+    def _set_state(self, state: tuple, index) -> None:
+        x0, x1, soc, filtered_I, p00, p01, p10, p11 = state
+        self._x[index, 0], self._x[index, 1], self._SOC[index], self._filtered_I[index] = x0, x1, soc, filtered_I
+        self._P[index, 0, 0], self._P[index, 0, 1], self._P[index, 1, 0], self._P[index, 1, 1] = p00, p01, p10, p11
+
+    @staticmethod
+    def _unflatten_parameters(flat: list) -> tuple:
+        """
+        Split a row of ``self._parameters`` (or a list of its columns) into its parameters.
+        """
+        num_coefficients = (len(flat) - 6) // 4
+        coefficients = [tuple(flat[6 + k * num_coefficients:6 + (k + 1) * num_coefficients]) for k in range(4)]
+
+        return flat[0], flat[1], tuple(flat[2:6]), *coefficients
+
+    def _step(self, state: tuple, parameters: tuple, z, u, dt, exp, minimum, clip) -> tuple:
+        """
+        Predict then update, where every quantity is either a float or an array over the batch.
+        """
+        x0, x1, soc, filtered_I, p00, p01, p10, p11 = state
+        Q_total, r, (q00, q01, q10, q11), U_oc_coefficients, R_0_coefficients, R_P_coefficients, C_P_coefficients = \
+            parameters
+        alpha = self._alpha
+        h = _JACOBIAN_STEP
+
+        # Predict, linearizing about the SOC left by the last update
+        R_P = _horner(R_P_coefficients, soc)
+        decay = exp(-dt / (R_P * _horner(C_P_coefficients, soc)))
+
+        x0 = x0 - dt / Q_total * u
+        x1 = decay * x1 + R_P * (1 - decay) * u
+
+        # P = F P F^T + Q, where F = [[1, 0], [0, decay]]
+        p00 = p00 + q00
+        p01 = decay * p01 + q01
+        p10 = decay * p10 + q10
+        p11 = decay * decay * p11 + q11
+
+        # Update, using low-pass filtered current in the measurement function Uoc(SOC) - Uc - R0(SOC) * I
+        filtered_I = alpha * filtered_I + (1 - alpha) * u
+
+        soc_for_jacobian = minimum(x0, 1.0)
+        dUoc = (_horner(U_oc_coefficients, soc_for_jacobian + h) -
+                _horner(U_oc_coefficients, soc_for_jacobian - h)) / (2 * h)
+        dR0 = (_horner(R_0_coefficients, soc_for_jacobian + h) -
+               _horner(R_0_coefficients, soc_for_jacobian - h)) / (2 * h)
+
+        # H = [H0, -1]
+        H0 = dUoc - dR0 * filtered_I
+
+        PHt0 = p00 * H0 - p01
+        PHt1 = p10 * H0 - p11
+        S = H0 * PHt0 - PHt1 + r
+        K0 = PHt0 / S
+        K1 = PHt1 / S
+
+        residual = z - (_horner(U_oc_coefficients, x0) - x1 - _horner(R_0_coefficients, x0) * filtered_I)
+        x0 = x0 + K0 * residual
+        x1 = x1 + K1 * residual
+
+        # Joseph form, P = (I - KH) P (I - KH)^T + K R K^T
+        a00 = 1 - K0 * H0
+        a01 = K0
+        a10 = -K1 * H0
+        a11 = 1 + K1
+
+        m00 = a00 * p00 + a01 * p10
+        m01 = a00 * p01 + a01 * p11
+        m10 = a10 * p00 + a11 * p10
+        m11 = a10 * p01 + a11 * p11
+
+        p00 = m00 * a00 + m01 * a01 + K0 * r * K0
+        p01 = m00 * a10 + m01 * a11 + K0 * r * K1
+        p10 = m10 * a00 + m11 * a01 + K1 * r * K0
+        p11 = m10 * a10 + m11 * a11 + K1 * r * K1
+
+        soc = clip(x0, 0.0, 1.1)
+
+        return x0, x1, soc, filtered_I, p00, p01, p10, p11
+
+
+def estimate_soc(
+        total_pack_voltages: Sequence[ArrayLike],
+        pack_currents: Sequence[ArrayLike],
+        time_steps: Sequence[float],
+        kalman_filter_configs: Sequence[KalmanFilterConfig],
+        initial_socs: Sequence[float]
+) -> list[tuple[NDArray, NDArray]]:
+    """
+    Estimate the SOC of several events together, both as modelled by an ``EquivalentCircuitBatteryModel`` and as
+    filtered by a ``BatchedFilteredBatteryModel``.
+
+    The series of every event are padded to the same length and filtered as one batch, with the padding masked out,
+    so that the cost of filtering many events is not the sum of the cost of filtering each of them.
+
+    The pipeline does not call this yet, as stages are scheduled one event at a time and ``EnergyStage`` filters
+    the SOC of its own event. It is meant for scripts that reprocess many events at once.
+
+    :param total_pack_voltages: the aligned total pack voltage of each event, in Volts
+    :param pack_currents: the aligned pack current of each event, in Amperes, where positive indicates current
+        being drawn
+    :param time_steps: the period of the series of each event, in seconds
+    :param kalman_filter_configs: the Kalman filter configuration of each event, along with the configuration of
+        its battery model
+    :param initial_socs: the SOC of each event at its first sample
+    :return: the unfiltered SOC and the filtered SOC of each event
+    """
+    lengths = [len(total_pack_voltage) for total_pack_voltage in total_pack_voltages]
+    padded_shape = (max(lengths, default=0), len(lengths))
+
+    padded_voltage = np.zeros(padded_shape)
+    padded_current = np.zeros(padded_shape)
+    mask = np.zeros(padded_shape, dtype=bool)
+
+    for j, (total_pack_voltage, pack_current, length) in enumerate(zip(total_pack_voltages, pack_currents, lengths)):
+        padded_voltage[:length, j] = total_pack_voltage
+        padded_current[:length, j] = pack_current
+        mask[:length, j] = True
+
+    filtered_soc = BatchedFilteredBatteryModel(kalman_filter_configs, initial_socs).filter(
+        padded_voltage,
+        padded_current,
+        time_steps,
+        mask=mask
+    )
+
+    estimates = []
+    for j, (pack_current, time_step, kalman_filter_config, initial_soc, length) in enumerate(
+            zip(pack_currents, time_steps, kalman_filter_configs, initial_socs, lengths)):
+        # The equivalent circuit model is already stepped in compiled code, so it's not worth batching
+        battery_model = EquivalentCircuitBatteryModel(kalman_filter_config.battery_model_config, initial_soc)
+        unfiltered_soc, _ = battery_model.update_array(time_step, current_array=-np.asarray(pack_current, dtype=float))
+
+        estimates.append((unfiltered_soc, filtered_soc[:length, j]))
+
+    return estimates
@@ -1,4 +1,5 @@
-from data_tools.schema import FileLoader, Result
+from data_tools.schema import FileLoader, Result, File, FileType, CanonicalPath
+from data_tools.collections import TimeSeries
 from stage.stage_registry import stage_registry
 from abc import ABC, abstractmethod, ABCMeta
 from collections.abc import Iterable
@@ -7,8 +8,13 @@ from logs import SunbeamLogger
 from typing import Callable
 from prefect import task
 from pathlib import Path
+from types import ModuleType
+import importlib.metadata
 import toml as tomllib
 import numpy as np
+import functools
+import hashlib
+import sys
 import logging
 import json
 import dill
@@ -16,6 +22,13 @@ import csv
 import os
 
 
+# The root of this project, within which every module is fingerprinted along with the stages that depend on it
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Installed packages that the outputs of stages depend on, whose versions are fingerprinted
+FINGERPRINTED_DISTRIBUTIONS = ("ubc-solar-physics", "ubc-solar-data-tools")
+
+
 class StageError(RuntimeError):
     """
     Error raised when a Stage has been improperly constructed.
@@ -45,6 +58,10 @@ class StageMeta(ABCMeta):
 
 
 class Stage(ABC, metaclass=StageMeta):
+    # Bump this whenever the behaviour of a stage changes in a way that its source code does not reflect, such as
+    # through a dependency outside of this project, so that outputs stored by the stage cache are recomputed
+    STAGE_VERSION: int = 1
+
     def __new__(cls, *args, **kwargs):
         if cls.get_stage_name() not in stage_registry:
             raise StageError(cls.get_stage_name(), f"Stage {cls.get_stage_name()} declared in {__file__} has not "
@@ -141,16 +158,142 @@ class Stage(ABC, metaclass=StageMeta):
     @abstractmethod
     def run(self: "Stage", *args) -> tuple[FileLoader, ...]:
         if not self.get_stage_name() in self._context.stages_to_skip:
+            use_cache = self.context.use_stage_cache and self.is_cacheable()
+
+            if use_cache:
+                # Acquire each input once, so that it can be both fingerprinted and extracted
+                args = tuple(_preload(arg) if isinstance(arg, FileLoader) else arg for arg in args)
+                fingerprint = self.fingerprint(*args)
+
+                cached_outputs = self._get_cached_outputs(fingerprint)
+                if cached_outputs is not None:
+                    self.logger.info(f"Inputs to {self.get_stage_name()} are unchanged, reusing stored outputs!")
+                    return cached_outputs
+
             # Here, we are annotating the stage functions at runtime as a Prefect task, then calling them
             extract = task(self.extract, name=f"{self.get_stage_name()} Extract")(*args)
             transform = task(self.transform, name=f"{self.get_stage_name()} Transform")(*extract)
             load = task(self.load, name=f"{self.get_stage_name()} Load")(*transform)
 
+            if use_cache:
+                self._store_fingerprint(fingerprint, load)
+
+            # The data source may be holding back some writes to batch them, make sure our outputs have been written
+            self.context.data_source.flush()
+
             return load
 
         else:
             return self.skip_stage()
 
+    @classmethod
+    def is_cacheable(cls) -> bool:
+        """
+        Whether the outputs of this stage are entirely determined by its input files, static stage data and code,
+        such that they can be reused when none of those have changed.
+
+        Stages which depend on anything else, such as an external API, should override this to return ``False``.
+        """
+        return True
+
+    def fingerprint(self, *args) -> str:
+        """
+        Compute a fingerprint of the content of the inputs to this stage, its static stage data, its ``STAGE_VERSION``,
+        the source code of every module of this project that it depends on (including the data source it stores
+        into), and the versions of the installed packages in ``FINGERPRINTED_DISTRIBUTIONS``.
+
+        :param args: the arguments that this stage is being run with
+        :return: the fingerprint as a hex digest
+        """
+        hasher = hashlib.blake2b(digest_size=32)
+
+        hasher.update(f"{self.get_stage_name()}:{self.STAGE_VERSION}".encode())
+
+        for distribution in FINGERPRINTED_DISTRIBUTIONS:
+            hasher.update(f"{distribution}=={_distribution_version(distribution)}".encode())
+
+        source_files = _project_source_files(type(self).__module__) | _project_source_files(
+            type(self.context.data_source).__module__)
+
+        for source_file in sorted(source_files):
+            hasher.update(str(source_file.relative_to(PROJECT_ROOT)).encode())
+            with open(source_file, "rb") as f:
+                hasher.update(f.read())
+
+        hasher.update(dill.dumps(self.stage_data))
+
+        for arg in args:
+            if isinstance(arg, FileLoader):
+                _hash_result(hasher, arg())
+            else:
+                hasher.update(dill.dumps(arg))
+
+        return hasher.hexdigest()
+
+    def _fingerprint_path(self) -> CanonicalPath:
+        return CanonicalPath(
+            origin=self.context.title,
+            event=self.event_name,  # Every cacheable stage processes a single event
+            source=self.get_stage_name(),
+            name="Fingerprint"
+        )
+
+    def _get_cached_outputs(self, fingerprint: str) -> tuple[FileLoader, ...] | None:
+        fingerprint_result: Result = self.context.data_source.get(self._fingerprint_path())
+
+        if not fingerprint_result or fingerprint_result.unwrap().data["fingerprint"] != fingerprint:
+            return None
+
+        output_paths = []
+        for output in fingerprint_result.unwrap().data["outputs"]:
+            output_path = CanonicalPath(
+                origin=output["origin"],
+                source=output["source"],
+                event=output["event"],
+                name=output["name"],
+            )
+
+            # Outputs may have been deleted since they were stored, in which case they have to be produced again
+            if output.get("stored", True) and not self.context.data_source.get(output_path):
+                self.logger.info(f"{output_path.name} of {self.get_stage_name()} no longer exists, so its stored "
+                                 f"outputs can't be reused.")
+                return None
+
+            output_paths.append(output_path)
+
+        return tuple(
+            self.context.data_source.store(
+                File(
+                    canonical_path=output_path,
+                    file_type=FileType.TimeSeries,
+                    data=None
+                )
+            ) for output_path in output_paths
+        )
+
+    def _store_fingerprint(self, fingerprint: str, outputs: tuple[FileLoader, ...]) -> None:
+        self.context.data_source.store(
+            File(
+                canonical_path=self._fingerprint_path(),
+                file_type=FileType.Any,
+                data={
+                    "fingerprint": fingerprint,
+                    "outputs": [
+                        {
+                            "origin": output.canonical_path.origin,
+                            "source": output.canonical_path.source,
+                            "event": output.canonical_path.event,
+                            "name": output.canonical_path.name,
+                            # Outputs that couldn't be produced are never stored, and aren't expected to exist
+                            "stored": bool(self.context.data_source.get(output.canonical_path)),
+                        } for output in outputs
+                    ]
+                },
+                description=f"Fingerprint of the inputs, static data, and code used to produce the outputs of "
+                            f"{self.get_stage_name()}."
+            )
+        )
+
     @staticmethod
     @abstractmethod
     def dependencies():
@@ -188,3 +331,82 @@ class Stage(ABC, metaclass=StageMeta):
     @property
     def stage_data(self) -> dict:
         return self._stage_data
+
+
+def _distribution_version(distribution: str) -> str:
+    try:
+        return importlib.metadata.version(distribution)
+
+    except importlib.metadata.PackageNotFoundError:
+        return "not installed"
+
+
+@functools.lru_cache(maxsize=None)
+def _project_source_files(module_name: str) -> frozenset[Path]:
+    """
+    Find the source file of the module ``module_name``, and of every module of this project that it imports, directly
+    or through other modules of this project. Modules are found by what their globals refer to, which covers both
+    ``import x`` and ``from x import y``.
+
+    :param module_name: the name of an imported module
+    :return: the source files of the modules of this project that ``module_name`` depends on, including its own
+    """
+    source_files = set()
+    pending = [module_name]
+    visited = set()
+
+    while pending:
+        name = pending.pop()
+        if name in visited:
+            continue
+        visited.add(name)
+
+        module = sys.modules.get(name)
+        source_file = getattr(module, "__file__", None)
+        if source_file is None:
+            continue
+
+        source_file = Path(source_file).resolve()
+        if not source_file.is_relative_to(PROJECT_ROOT) or "site-packages" in source_file.parts:
+            continue
+
+        source_files.add(source_file)
+
+        for value in vars(module).values():
+            if isinstance(value, ModuleType):
+                pending.append(value.__name__)
+
+            elif isinstance(getattr(value, "__module__", None), str):
+                pending.append(value.__module__)
+
+    return frozenset(source_files)
+
+
+def _preload(file_loader: FileLoader) -> FileLoader:
+    """
+    Invoke ``file_loader`` now, and obtain a ``FileLoader`` that returns the acquired ``Result`` when invoked.
+    """
+    result: Result = file_loader()
+
+    return FileLoader(lambda _: result, file_loader.canonical_path)
+
+
+def _hash_result(hasher, result: Result) -> None:
+    """
+    Update ``hasher`` with the content of the ``File`` contained by ``result``, if there is one.
+    """
+    if not result:
+        hasher.update(b"missing")
+        return
+
+    data = result.unwrap().data
+
+    if isinstance(data, np.ndarray) and data.dtype != object:
+        hasher.update(f"{data.dtype}{data.shape}".encode())
+        hasher.update(np.ascontiguousarray(data).data)
+
+        if isinstance(data, TimeSeries):
+            hasher.update(f"{data.start.timestamp()}{data.stop.timestamp()}{data.period}{data.units}".encode())
+
+    else:
+        hasher.update(dill.dumps(data))
@@ -76,6 +76,11 @@ class WeatherStage(Stage):
     def get_stage_name(cls):
         return "weather"
 
+    @classmethod
+    def is_cacheable(cls) -> bool:
+        # Weather is queried from Solcast, which may change at any time
+        return False
+
     @staticmethod
     def dependencies():
         return []
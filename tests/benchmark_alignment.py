@@ -0,0 +1,62 @@
+import pipeline  # `stage` must be imported by way of `pipeline`, which it depends on
+from data_tools.collections import TimeSeries
+from stage.alignment import AlignmentCache
+import numpy as np
+import datetime
+import time
+
+# Compares the runtime of aligning the same pair of TimeSeries several times, as PowerStage and EnergyStage both do,
+# with TimeSeries.align against an AlignmentCache, on synthetic data sampled at different rates
+
+HOURS = 8
+NUM_ALIGNMENTS = 4
+START = datetime.datetime(2024, 7, 16, 9)
+
+rng = np.random.default_rng(0)
+
+
+def synthetic_time_series(period: float, offset: float, field: str) -> TimeSeries:
+    num_samples = int(HOURS * 3600 / period)
+    start = START + datetime.timedelta(seconds=offset)
+    stop = start + datetime.timedelta(seconds=(num_samples - 1) * period)
+
+    return TimeSeries(rng.normal(size=num_samples).cumsum(), {
+        "start": start,
+        "stop": stop,
+        "car": "Brightside",
+        "measurement": "Synthetic",
+        "field": field,
+        "period": period,
+        "length": stop.timestamp() - start.timestamp(),
+        "units": "",
+    })
+
+
+total_pack_voltage = synthetic_time_series(0.1, 0.0, "TotalPackVoltage")
+pack_current = synthetic_time_series(0.25, 3.37, "PackCurrent")
+
+start = time.perf_counter()
+for _ in range(NUM_ALIGNMENTS):
+    reference = TimeSeries.align(total_pack_voltage, pack_current)
+align_time = time.perf_counter() - start
+
+alignment_cache = AlignmentCache()
+
+start = time.perf_counter()
+first = alignment_cache.align(total_pack_voltage, pack_current)
+first_time = time.perf_counter() - start
+
+start = time.perf_counter()
+cached = [alignment_cache.align(total_pack_voltage, pack_current) for _ in range(NUM_ALIGNMENTS - 1)]
+cached_time = (time.perf_counter() - start) / (NUM_ALIGNMENTS - 1)
+
+identical = all(
+    np.array_equal(expected, actual) and expected.start == actual.start and expected.stop == actual.stop
+    for aligned in [first, *cached] for expected, actual in zip(reference, aligned)
+)
+
+print(f"TimeSeries.align:            {align_time / NUM_ALIGNMENTS * 1e3:7.2f} ms per alignment")
+print(f"AlignmentCache, first:       {first_time * 1e3:7.2f} ms "
+      f"({align_time / NUM_ALIGNMENTS / first_time:.1f}x)")
+print(f"AlignmentCache, cached:      {cached_time * 1e3:7.2f} ms per alignment "
+      f"({align_time / NUM_ALIGNMENTS / cached_time:.1f}x), identical: {identical}")
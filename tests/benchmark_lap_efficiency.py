@@ -0,0 +1,70 @@
+import pipeline  # `stage` must be imported by way of `pipeline`, which it depends on
+from stage.efficiency_stage import EfficiencyStage, NCM_LAP_LEN_M
+from stage.efficiency_stage import MIN_AVG_METERS_PER_SEC, MAX_AVG_METERS_PER_SEC, MIN_AVG_WATTS, MAX_AVG_WATTS
+import numpy as np
+import time
+
+# Compares the runtime of EfficiencyStage.get_lap_dist_efficiency against the per-sample loop it replaced, on one
+# synthetic day of driving for each day of FSGP
+
+NUM_DAYS = 3
+HOURS_PER_DAY = 8
+PERIOD = 0.1
+
+
+def get_lap_dist_efficiency_loop(speed_mps_aligned, motor_power_aligned, lap_index_aligned) -> np.ndarray:
+    lap_index = np.array(lap_index_aligned, dtype=int)
+    vv_aligned_arr = np.array(speed_mps_aligned)
+    mp_aligned_arr = np.array(motor_power_aligned)
+    efficiency_lap_distance = np.zeros(int(np.max(lap_index) + 1))
+
+    sum_power = 0
+    sum_speed = 0
+    num_vals = 0
+    prev_lap_idx = 0
+    for array_index, lap_idx in enumerate(lap_index):
+        if lap_idx > prev_lap_idx:
+            avg_power = sum_power / num_vals
+            avg_speed = sum_speed / num_vals
+
+            if ((avg_speed > MAX_AVG_METERS_PER_SEC) | (avg_speed < MIN_AVG_METERS_PER_SEC)
+                    | (avg_power < MIN_AVG_WATTS) | (avg_power > MAX_AVG_WATTS)):
+                efficiency_lap_distance[lap_idx] = np.nan
+            else:
+                efficiency_lap_distance[lap_idx] = avg_power / avg_speed
+
+            sum_power = 0
+            sum_speed = 0
+            num_vals = 0
+            prev_lap_idx = lap_idx
+
+        sum_power += mp_aligned_arr[array_index]
+        sum_speed += vv_aligned_arr[array_index]
+        num_vals += 1
+
+    return np.array(efficiency_lap_distance)
+
+
+rng = np.random.default_rng(0)
+num_samples = int(HOURS_PER_DAY * 3600 / PERIOD)
+samples = np.arange(num_samples)
+
+for day in range(1, NUM_DAYS + 1):
+    speed = np.clip(15 + 5 * np.sin(samples / 3000 + day) + rng.normal(0, 1, num_samples), 0, None)
+    speed[rng.integers(0, num_samples, 20) + np.arange(20)[:, np.newaxis] * 50] = 0  # a few stops
+    power = 50 * speed + rng.normal(0, 100, num_samples)
+
+    # GPS jitter can briefly send the lap index backwards at the end of a lap
+    lap_index = np.cumsum(speed * PERIOD) / NCM_LAP_LEN_M + rng.normal(0, 1e-3, num_samples)
+
+    start = time.perf_counter()
+    reference = get_lap_dist_efficiency_loop(speed, power, lap_index)
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    efficiency = EfficiencyStage.get_lap_dist_efficiency(speed, power, lap_index)
+    vectorized_time = time.perf_counter() - start
+
+    print(f"Day {day}: {len(efficiency)} laps, loop {loop_time * 1e3:8.2f} ms, "
+          f"vectorized {vectorized_time * 1e3:6.2f} ms ({loop_time / vectorized_time:.0f}x), "
+          f"identical: {np.array_equal(efficiency, reference, equal_nan=True)}")
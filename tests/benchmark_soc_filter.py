@@ -0,0 +1,89 @@
+from physics.models.battery import BatteryModelConfig, KalmanFilterConfig, FilteredBatteryModel
+import pipeline  # `stage` must be imported by way of `pipeline`, which it depends on
+from stage.soc_filter import BatchedFilteredBatteryModel, estimate_soc
+import numpy as np
+import pathlib
+import tomllib
+import time
+
+# Compares the SOC estimated by the filter that EnergyStage uses against FilteredBatteryModel, on synthetic data
+
+EVENT = "FSGP_2025_Day_1"
+NUM_SAMPLES = 20_000
+BATCH_SIZES = (8, 64)
+TIME_STEP = 0.1
+INITIAL_SOC = 0.8
+
+energy_stage_data = pathlib.Path(__file__).parent.parent / "stage" / "energy" / EVENT
+
+with open(energy_stage_data / "battery_model_config.toml", "rb") as f:
+    battery_model_config = BatteryModelConfig(**tomllib.load(f))
+
+with open(energy_stage_data / "kalman_filter_config.toml", "rb") as f:
+    kalman_filter_config_data = tomllib.load(f)
+
+kalman_filter_config = KalmanFilterConfig(
+    battery_model_config=battery_model_config,
+    state_covariance_matrix=np.array(kalman_filter_config_data["state_covariance_matrix"]),
+    process_noise_matrix=np.array(kalman_filter_config_data["process_noise_matrix"]),
+    measurement_noise_vector=np.array([kalman_filter_config_data["measurement_noise_vector"]]),
+)
+
+rng = np.random.default_rng(0)
+samples = np.arange(NUM_SAMPLES)
+current = 10 + 5 * np.sin(samples / 500) + rng.normal(0, 1, NUM_SAMPLES)
+voltage = 125 - 0.1 * current + rng.normal(0, 0.3, NUM_SAMPLES) - samples * 1e-4
+
+# 1. The per-sample filter
+start = time.perf_counter()
+filtered_battery_model = FilteredBatteryModel(kalman_filter_config, INITIAL_SOC)
+reference_soc = np.zeros(NUM_SAMPLES)
+
+for i, (v, c) in enumerate(zip(voltage, current)):
+    filtered_battery_model.predict_then_update(v, c, TIME_STEP)
+    reference_soc[i] = filtered_battery_model.SOC
+
+reference_time = time.perf_counter() - start
+
+# 2. A single event
+start = time.perf_counter()
+soc = BatchedFilteredBatteryModel(kalman_filter_config, INITIAL_SOC).filter(voltage, current, TIME_STEP)
+single_time = time.perf_counter() - start
+
+print(f"FilteredBatteryModel:                  {reference_time / NUM_SAMPLES * 1e6:8.2f} us/sample")
+print(f"BatchedFilteredBatteryModel, 1 event:  {single_time / NUM_SAMPLES * 1e6:8.2f} us/sample "
+      f"({reference_time / single_time:.1f}x), max error {np.max(np.abs(soc - reference_soc)):.2e}")
+
+# 3. Several events side-by-side
+for batch_size in BATCH_SIZES:
+    start = time.perf_counter()
+    batched_soc = BatchedFilteredBatteryModel(kalman_filter_config, np.full(batch_size, INITIAL_SOC)).filter(
+        np.repeat(voltage[:, np.newaxis], batch_size, axis=1),
+        np.repeat(current[:, np.newaxis], batch_size, axis=1),
+        TIME_STEP
+    )
+    batched_time = time.perf_counter() - start
+
+    print(f"BatchedFilteredBatteryModel, {batch_size} events: "
+          f"{batched_time / NUM_SAMPLES / batch_size * 1e6:8.2f} us/sample "
+          f"({reference_time * batch_size / batched_time:.1f}x), "
+          f"max error {np.max(np.abs(batched_soc - reference_soc[:, np.newaxis])):.2e}")
+
+# 4. Several events of different lengths, padded and masked
+for batch_size in BATCH_SIZES:
+    lengths = rng.integers(NUM_SAMPLES // 2, NUM_SAMPLES, batch_size, endpoint=True)
+
+    start = time.perf_counter()
+    estimates = estimate_soc(
+        [voltage[:length] for length in lengths],
+        [current[:length] for length in lengths],
+        [TIME_STEP] * batch_size,
+        [kalman_filter_config] * batch_size,
+        [INITIAL_SOC] * batch_size
+    )
+    estimate_time = time.perf_counter() - start
+
+    max_error = max(np.max(np.abs(filtered_soc - reference_soc[:len(filtered_soc)])) for _, filtered_soc in estimates)
+    print(f"estimate_soc, {batch_size} events of different lengths: "
+          f"{estimate_time / np.sum(lengths) * 1e6:8.2f} us/sample "
+          f"({reference_time / NUM_SAMPLES * np.sum(lengths) / estimate_time:.1f}x), max error {max_error:.2e}")
@@ -2,18 +2,18 @@ from data_tools import DBClient
 import matplotlib.pyplot as plt
 from datetime import datetime
 import pytz
-from config import config_directory
+from data_tools.schema import CanonicalPath
+from config import config_directory, FSDataSourceConfig
+from data_source import FSDataSource
 import toml as tomllib
-import dill
-import os
 
 # 1. Load Sunbeam Motor Power
 
-pow_dir = os.path.normpath(os.path.join(os.getcwd(), 'fs_data/pipeline/FSGP_2024_Day_1/power'))
-print("Loading from folder: ", pow_dir)
+fs_data_source = FSDataSource(FSDataSourceConfig(data_source_type="FSDataSource", fs_root="fs_data"))
+motor_power_path = CanonicalPath(origin="pipeline", event="FSGP_2024_Day_1", source="power", name="MotorPower")
+print("Loading: ", motor_power_path.to_string())
 
-with open(os.path.join(pow_dir, 'MotorPower.bin'), 'rb') as f:
-    motor_power_sunbeam = dill.load(f).data
+motor_power_sunbeam = fs_data_source.get(motor_power_path).unwrap().data
 
 # 2. Get Influx Motor power (same method as we have been using for data_analysis)
 